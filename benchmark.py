@@ -0,0 +1,363 @@
+"""Headless benchmark of streamlit_app4.py.
+
+Drives the app through streamlit.testing.v1.AppTest, one scenario per
+fresh interpreter so every scenario starts with cold caches and gets its
+own peak RSS:
+
+* every tab, the AI对话 tab answering one prompt from a local stub of the
+  OpenAI-compatible chat API (no network, no API key);
+* for each synthetic upload size: the 数据分析 tab parsing and showing the
+  upload, then each option of the chart type selector on it.
+
+Uploads are CSV files of random numbers (rows x columns, e.g. 1k-1M rows
+and 10-200 columns), generated once per size in the temp directory.
+
+For each scenario the measured step is timed (wall_seconds), the same page
+is rerun to time it with warm caches (rerun_seconds), and the process's
+peak RSS and the bytes the step would send to the browser (forward
+messages plus media files such as Matplotlib images) are recorded.
+
+Run from the repository root::
+
+    python benchmark.py [--sizes 1000x10 100000x50] [--repeat 3] [--json bench.json] [--baseline old.json]
+"""
+import argparse
+import ast
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unicodedata
+
+import numpy as np
+
+import data_store
+
+APP_PATH = 'streamlit_app4.py'
+DEFAULT_SIZES = ('1000x10', '100000x50')
+ANALYSIS_TAB = '数据分析'
+CHAT_TAB = 'AI对话'
+CHAT_PROMPT = '叶顶间隙对等熵效率有什么影响？'
+STUB_ANSWER_WORDS = 200
+CSV_CHUNK_ROWS = 100_000  # Rows generated and written at a time, so 1M x 200 uploads fit in memory
+SCENARIO_TIMEOUT = 600  # Seconds per AppTest run
+NAME_WIDTH = 60
+
+
+def app_constant(name, path=APP_PATH):
+    # A literal module-level constant of the app (TAB_NAMES, UPLOAD_HEADER_ROW), read without running it.
+    with open(path, encoding='utf-8') as f:
+        tree = ast.parse(f.read(), filename=path)
+    for statement in tree.body:
+        if isinstance(statement, ast.Assign) and any(getattr(t, 'id', None) == name for t in statement.targets):
+            return ast.literal_eval(statement.value)
+    raise ValueError(f"No {name} in '{path}'")
+
+
+def tab_names(path=APP_PATH):
+    return app_constant('TAB_NAMES', path)
+
+
+def parse_size(text):
+    rows, cols = (int(part) for part in text.lower().split('x'))
+    if rows < 1 or cols < 1:
+        raise argparse.ArgumentTypeError(f"Size must be ROWSxCOLUMNS, got '{text}'")
+    return rows, cols
+
+
+def synthetic_upload(rows, cols, seed=0, directory=None, header_row=0):
+    # Path of a CSV of `rows` x `cols` random floats, generated on first use. The column names are on line
+    # `header_row` (0-based), after group rows like the 参数大类/参数分组 rows of the workbooks, since the
+    # app reads uploads with header=UPLOAD_HEADER_ROW.
+    directory = directory or os.path.join(tempfile.gettempdir(), 'streamlit_app4-benchmark')
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"upload-{rows}x{cols}-{seed}-h{header_row}.csv")
+    if os.path.exists(path):
+        return path
+    rng = np.random.default_rng(seed)
+    with data_store.atomic_output(path) as tmp, open(tmp, 'w', encoding='utf-8', newline='') as f:
+        for level in range(header_row):
+            f.write(",".join(f"group{level}-{i // 10}" for i in range(cols)) + "\n")
+        f.write(",".join(f"p{i}" for i in range(cols)) + "\n")
+        for start in range(0, rows, CSV_CHUNK_ROWS):
+            chunk = rng.normal(size=(min(CSV_CHUNK_ROWS, rows - start), cols))
+            np.savetxt(f, chunk, fmt='%.6g', delimiter=',')
+    return path
+
+
+def _app_with_upload(app_path, upload_path):
+    # Runs the app with st.file_uploader returning `upload_path`; AppTest cannot upload files itself.
+    # Executed by AppTest from its source, so it only uses its arguments and its own imports.
+    import os
+    import streamlit as st
+    from streamlit.runtime.uploaded_file_manager import UploadedFile, UploadedFileRec
+
+    file_uploader = st.file_uploader
+
+    def uploader(*args, **kwargs):
+        file_uploader(*args, **kwargs)
+        with open(upload_path, 'rb') as f:
+            data = f.read()
+        return UploadedFile(UploadedFileRec(upload_path, os.path.basename(upload_path), 'text/csv', data), None)
+
+    st.file_uploader = uploader
+    with open(app_path, encoding='utf-8') as f:
+        code = compile(f.read(), app_path, 'exec')
+    exec(code, {'__name__': '__main__'})
+
+
+# ---- SCENARIO (runs in the child interpreter) ----
+class _PayloadCounter:
+    # Bytes of forward messages and media files produced since the last reset().
+    def __init__(self):
+        from streamlit.runtime.forward_msg_queue import ForwardMsgQueue
+        from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+
+        self.message_bytes = self.media_bytes = 0
+        enqueue, load_and_get_id = ForwardMsgQueue.enqueue, MemoryMediaFileStorage.load_and_get_id
+
+        def counted_enqueue(queue, msg):
+            self.message_bytes += msg.ByteSize()
+            return enqueue(queue, msg)
+
+        def counted_load_and_get_id(storage, path_or_data, *args, **kwargs):
+            self.media_bytes += len(path_or_data) if isinstance(path_or_data, bytes) else os.path.getsize(path_or_data)
+            return load_and_get_id(storage, path_or_data, *args, **kwargs)
+
+        ForwardMsgQueue.enqueue = counted_enqueue
+        MemoryMediaFileStorage.load_and_get_id = counted_load_and_get_id
+
+    def reset(self):
+        self.message_bytes = self.media_bytes = 0
+
+
+def _start_stub_llm(words=STUB_ANSWER_WORDS):
+    # Base URL of a local server streaming a fixed `words`-word answer in the OpenAI chat completion format.
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, *args):
+            pass
+
+        def _chunk(self, data):
+            body = f"data: {data}\n\n".encode()
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(body), body))
+
+        def do_POST(self):
+            request = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+            pieces = [f"w{i} " for i in range(words)]
+            if not request.get('stream'):
+                body = json.dumps({'id': 'stub', 'object': 'chat.completion', 'created': 0, 'model': 'stub',
+                                   'choices': [{'index': 0, 'finish_reason': 'stop',
+                                                'message': {'role': 'assistant', 'content': ''.join(pieces)}}]}).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            for piece in pieces:
+                self._chunk(json.dumps({'id': 'stub', 'object': 'chat.completion.chunk', 'created': 0, 'model': 'stub',
+                                        'choices': [{'index': 0, 'delta': {'content': piece}, 'finish_reason': None}]}))
+            self._chunk('[DONE]')
+            self.wfile.write(b"0\r\n\r\n")
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, name='stub-llm', daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+
+def _peak_rss_mb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 ** (2 if sys.platform == 'darwin' else 1)  # Bytes on macOS, KiB elsewhere
+
+
+def _errors(at):
+    return [e.message for e in at.exception]
+
+
+def run_scenario(spec):
+    # Runs one scenario ({'app', 'tab', 'upload', 'chart'}) in this process and returns its measurements.
+    from streamlit.testing.v1 import AppTest
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(spec['app'])))
+    counter = _PayloadCounter()
+    if spec['tab'] == CHAT_TAB:
+        os.environ.update(DEEPSEEK_BASE_URL=_start_stub_llm(), DEEPSEEK_API_KEY='benchmark',
+                          DEEPSEEK_CACHE_PATH=os.path.join(tempfile.mkdtemp(), 'chat.sqlite3'))
+    if spec.get('upload'):
+        at = AppTest.from_function(_app_with_upload, args=(spec['app'], spec['upload']), default_timeout=SCENARIO_TIMEOUT)
+    else:
+        at = AppTest.from_file(spec['app'], default_timeout=SCENARIO_TIMEOUT)
+
+    # Everything before the measured step is set-up; the home page is what the first run shows.
+    start = time.perf_counter()
+    at.run()
+    if spec['tab'] != tab_names(spec['app'])[0]:
+        counter.reset()
+        start = time.perf_counter()
+        at.radio(key='active_tab').set_value(spec['tab']).run()
+    if spec.get('chart'):
+        counter.reset()
+        start = time.perf_counter()
+        at.selectbox(key='chart_type_selector').set_value(spec['chart']).run()
+    if spec['tab'] == CHAT_TAB:
+        counter.reset()
+        start = time.perf_counter()
+        at.chat_input[0].set_value(CHAT_PROMPT).run()
+        deadline = start + SCENARIO_TIMEOUT
+        while 'chat_generation' in at.session_state and time.perf_counter() < deadline:
+            time.sleep(0.05)
+            at.run()  # What the polling fragment does until the answer is complete
+    wall = time.perf_counter() - start
+    result = {'wall_seconds': wall, 'message_bytes': counter.message_bytes, 'media_bytes': counter.media_bytes,
+              'errors': _errors(at)}
+    if spec['tab'] == ANALYSIS_TAB and spec.get('upload') and not spec.get('chart'):
+        selector = at.selectbox(key='chart_type_selector')
+        result['chart_types'] = list(selector.options)
+    start = time.perf_counter()
+    at.run()
+    result['rerun_seconds'] = time.perf_counter() - start
+    result['peak_rss_mb'] = _peak_rss_mb()
+    return result
+# ---- END SCENARIO ----
+
+
+def _run_child(spec, cwd):
+    result = subprocess.run([sys.executable, os.path.abspath(__file__), '--scenario', json.dumps(spec, ensure_ascii=False)],
+                            cwd=cwd, capture_output=True, text=True, encoding='utf-8')
+    lines = result.stdout.strip().splitlines()
+    if result.returncode != 0 or not lines:
+        return {'errors': [f"exit code {result.returncode}: {result.stderr.strip()[-2000:]}"]}
+    return json.loads(lines[-1])
+
+
+def measure(spec, repeat=1, cwd='.'):
+    # Median wall and rerun times and the highest peak RSS over `repeat` fresh interpreters.
+    runs = [_run_child(spec, cwd) for _ in range(repeat)]
+    ok = [run for run in runs if 'wall_seconds' in run]
+    if not ok:
+        return dict(spec, errors=runs[0]['errors'])
+    result = dict(spec, **ok[0])
+    result['payload_bytes'] = result['message_bytes'] + result['media_bytes']
+    result['wall_seconds'] = statistics.median(run['wall_seconds'] for run in ok)
+    result['rerun_seconds'] = statistics.median(run['rerun_seconds'] for run in ok)
+    if all(run['peak_rss_mb'] is not None for run in ok):
+        result['peak_rss_mb'] = max(run['peak_rss_mb'] for run in ok)
+    result['errors'] = [e for run in runs for e in run['errors']]
+    return result
+
+
+def scenario_name(result):
+    parts = [result['tab']]
+    if result.get('rows'):
+        parts.append(f"{result['rows']}x{result['cols']}")
+    if result.get('chart'):
+        parts.append(result['chart'])
+    return "/".join(parts)
+
+
+def run_suite(path=APP_PATH, sizes=DEFAULT_SIZES, repeat=1, report=print):
+    path = os.path.abspath(path)
+    cwd = os.path.dirname(path)
+    specs = [{'app': path, 'tab': tab} for tab in tab_names(path)]
+    header_row = app_constant('UPLOAD_HEADER_ROW', path)
+    results = []
+
+    def add(spec):
+        result = measure(spec, repeat, cwd)
+        result['name'] = scenario_name(result)
+        results.append(result)
+        report(_format_result(result))
+        return result
+
+    for spec in specs:
+        add(spec)
+    for rows, cols in sizes:
+        upload = synthetic_upload(rows, cols, header_row=header_row)
+        base = add({'app': path, 'tab': ANALYSIS_TAB, 'upload': upload, 'rows': rows, 'cols': cols})
+        for chart in base.pop('chart_types', []):
+            add({'app': path, 'tab': ANALYSIS_TAB, 'upload': upload, 'rows': rows, 'cols': cols, 'chart': chart})
+    return {
+        'app': os.path.basename(path),
+        'python': sys.version.split()[0],
+        'streamlit': _streamlit_version(),
+        'repeat': repeat,
+        'scenarios': [{k: v for k, v in r.items() if k not in ('app', 'upload', 'chart_types')} for r in results],
+    }
+
+
+def _streamlit_version():
+    from importlib.metadata import version
+
+    return version('streamlit')
+
+
+def _pad(text, width=NAME_WIDTH):
+    # Left-aligns `text` in `width` terminal columns; CJK characters take two.
+    used = sum(2 if unicodedata.east_asian_width(c) in 'WF' else 1 for c in text)
+    return text + " " * max(width - used, 1)
+
+
+def _format_result(result):
+    if 'wall_seconds' not in result:
+        return f"{_pad(result['name'])}  FAILED  {result['errors'][0][:200]}"
+    rss = f"{result['peak_rss_mb']:>9.0f}" if result.get('peak_rss_mb') is not None else f"{'-':>9}"
+    line = (f"{_pad(result['name'])}{result['wall_seconds']:>9.3f}{result['rerun_seconds']:>9.3f}"
+            f"{rss}{result['payload_bytes'] / 1024:>12.1f}")
+    return line + (f"  {len(result['errors'])} error(s)" if result['errors'] else "")
+
+
+def compare(report, baseline):
+    # Lines of "name: wall ±%, rss ±%, payload ±%" for scenarios present in both reports.
+    before = {s['name']: s for s in baseline['scenarios'] if 'wall_seconds' in s}
+    lines = []
+    for scenario in report['scenarios']:
+        old = before.get(scenario['name'])
+        if old is None or 'wall_seconds' not in scenario:
+            continue
+        changes = []
+        for key in ('wall_seconds', 'peak_rss_mb', 'payload_bytes'):
+            if scenario.get(key) is not None and old.get(key):
+                changes.append(f"{key} {100 * (scenario[key] / old[key] - 1):+.0f}%")
+        lines.append(f"{scenario['name']}: {', '.join(changes)}")
+    return lines
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--app', default=APP_PATH)
+    parser.add_argument('--sizes', nargs='+', type=parse_size, default=[parse_size(s) for s in DEFAULT_SIZES],
+                        metavar='ROWSxCOLS', help="synthetic upload sizes, e.g. 1000x10 1000000x200")
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--json', help="also write the results to this file")
+    parser.add_argument('--baseline', help="results of an earlier run to compare against")
+    parser.add_argument('--scenario', help=argparse.SUPPRESS)  # Internal: run one scenario and print its JSON
+    args = parser.parse_args()
+    if args.scenario:
+        result = run_scenario(json.loads(args.scenario))
+        sys.stdout.flush()
+        print(json.dumps(result, ensure_ascii=False))
+    else:
+        print(f"{_pad('scenario')}{'wall s':>9}{'rerun s':>9}{'RSS MB':>9}{'payload KB':>12}")
+        results = run_suite(args.app, args.sizes, args.repeat)
+        if args.json:
+            with open(args.json, 'w', encoding='utf-8') as f:
+                json.dump(results, f, indent=2, ensure_ascii=False)
+        if args.baseline:
+            with open(args.baseline, encoding='utf-8') as f:
+                print("\n" + "\n".join(compare(results, json.load(f))))
@@ -0,0 +1,157 @@
+"""Array reductions behind the analysis charts.
+
+Pure numpy/pandas, with no Streamlit, so they can be imported and checked
+on their own (tests/test_chart_kernels.py):
+
+* pairwise-complete Pearson and Spearman matrices for every column pair
+  at once (the correlation heatmap);
+* histogram, Gaussian KDE and rug reduced to a few hundred numbers (the
+  distplots);
+* grid decimation to a point budget (the 3D and Bokeh scatters);
+* inclusive row ranges gathered into one labelled frame (散点图1).
+"""
+import numpy as np
+import pandas as pd
+
+CORRELATION_CHUNK_ROWS = 16384
+SPEARMAN_EXACT_MAX_CELLS = 20_000_000  # Budget for re-ranking column pairs whose missing rows differ
+KDE_GRID_POINTS = 500  # Same resolution as the curve of ff.create_distplot
+HISTOGRAM_MAX_BINS = 1000
+RUG_MAX_POINTS = 2000
+
+
+def pairwise_pearson(values, mask):
+    # (r, counts): Pearson r over pairwise-complete rows for every column pair at once, accumulated in row
+    # chunks, and the number of rows behind each coefficient.
+    # values may be float32; only one row chunk at a time is upcast to float64.
+    p = values.shape[1]
+    n, sx, sxx, sxy = (np.zeros((p, p)) for _ in range(4))
+    total, count = np.zeros(p), np.zeros(p)
+    for start in range(0, len(values), CORRELATION_CHUNK_ROWS):
+        m = mask[start:start + CORRELATION_CHUNK_ROWS]
+        total += np.where(m, values[start:start + CORRELATION_CHUNK_ROWS], 0.0).sum(axis=0)
+        count += m.sum(axis=0)
+    center = np.divide(total, count, out=np.zeros(p), where=count > 0)
+    for start in range(0, len(values), CORRELATION_CHUNK_ROWS):
+        m = mask[start:start + CORRELATION_CHUNK_ROWS]
+        x = np.where(m, values[start:start + CORRELATION_CHUNK_ROWS] - center, 0.0)
+        m = m.astype(np.float64)
+        n += m.T @ m
+        sx += x.T @ m
+        sxx += (x * x).T @ m
+        sxy += x.T @ x
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cov = sxy - sx * sx.T / n
+        var = sxx - sx ** 2 / n
+        r = cov / np.sqrt(var * var.T)
+    degenerate = (n < 2) | (var <= 1e-12 * sxx) | (var.T <= 1e-12 * sxx.T)
+    r[degenerate] = np.nan
+    return np.clip(r, -1, 1), n
+
+
+def _rank_dtype(rows):
+    # Average ranks are multiples of 0.5, exact in float32 up to 2**23 rows.
+    return np.float32 if rows <= 2 ** 23 else np.float64
+
+
+def spearman_matrix(values, mask, counts):
+    # (r, exact). Ranks are computed once per column; for columns with the same missing rows that is exact
+    # Spearman. Other pairs are re-ranked over their common rows unless that exceeds SPEARMAN_EXACT_MAX_CELLS,
+    # in which case they keep the approximation and exact is False.
+    ranks = np.empty(values.shape, _rank_dtype(len(values)), order='F')
+    for j in range(values.shape[1]):
+        ranks[:, j] = pd.Series(values[:, j]).rank().to_numpy()
+    r, _ = pairwise_pearson(ranks, mask)
+    signature = [hash(np.packbits(mask[:, j]).tobytes()) for j in range(mask.shape[1])]
+    pairs = [(i, j) for i in range(len(signature)) for j in range(i + 1, len(signature))
+             if signature[i] != signature[j] and counts[i, j] >= 2]
+    if sum(counts[i, j] for i, j in pairs) > SPEARMAN_EXACT_MAX_CELLS:
+        return r, False
+    for i, j in pairs:
+        rows = mask[:, i] & mask[:, j]
+        a = pd.Series(values[rows, i]).rank().to_numpy()
+        b = pd.Series(values[rows, j]).rank().to_numpy()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            r[i, j] = r[j, i] = np.corrcoef(a, b)[0, 1] if a.std() > 0 and b.std() > 0 else np.nan
+    return r, True
+
+
+def binned_kde(values, start, end, grid_points=KDE_GRID_POINTS):
+    # Gaussian KDE with Scott's bandwidth (as ff.create_distplot/scipy), evaluated by linearly binning the
+    # samples onto a regular grid and convolving with the kernel via FFT: O(n + g log g) instead of O(n * g).
+    grid = np.linspace(start, end, grid_points)
+    bandwidth = values.std(ddof=1) * len(values) ** (-1 / 5)
+    if not np.isfinite(bandwidth) or bandwidth <= 0 or end <= start:
+        return None
+    step = grid[1] - grid[0]
+    pos = (values - start) / step
+    left = np.clip(np.floor(pos).astype(np.int64), 0, grid_points - 2)
+    frac = pos - left
+    weights = np.bincount(left, 1 - frac, grid_points) + np.bincount(left + 1, frac, grid_points)
+    half_width = min(grid_points - 1, int(np.ceil(5 * bandwidth / step)))
+    offsets = np.arange(-half_width, half_width + 1) * step
+    kernel = np.exp(-0.5 * (offsets / bandwidth) ** 2) / (bandwidth * np.sqrt(2 * np.pi))
+    size = 1 << int(np.ceil(np.log2(grid_points + len(kernel) - 1)))
+    density = np.fft.irfft(np.fft.rfft(weights, size) * np.fft.rfft(kernel, size), size)
+    density = density[half_width:half_width + grid_points] / len(values)
+    return grid, np.clip(density, 0, None)
+
+
+def density_summary(values, bin_size, grid_points=KDE_GRID_POINTS, rug_points=RUG_MAX_POINTS):
+    # Everything a distplot needs, reduced to a few hundred numbers: histogram, KDE curve and a capped rug.
+    values = np.asarray(values, dtype=np.float64)
+    values = values[np.isfinite(values)]
+    start, end = values.min(), values.max()
+    bin_count = int((end - start) // bin_size) + 1
+    if bin_count > HISTOGRAM_MAX_BINS:
+        bin_count, bin_size = HISTOGRAM_MAX_BINS, (end - start) / (HISTOGRAM_MAX_BINS - 1)
+    counts, edges = np.histogram(values, bins=bin_count, range=(start, start + bin_count * bin_size))
+    rug = np.sort(values)
+    if len(rug) > rug_points:
+        rug = rug[np.linspace(0, len(rug) - 1, rug_points).astype(np.int64)]  # Evenly spaced order statistics
+    return {
+        "edges": edges,
+        "density": counts / (len(values) * bin_size),
+        "kde": binned_kde(values, start, end, grid_points),
+        "rug": rug,
+    }
+
+
+def decimate_indices(columns, budget):
+    # Grid (voxel) decimation: per occupied cell keep the points with the smallest and largest value of the
+    # last column, plus the global extremes of every column. The grid coarsens until the budget is met.
+    n = len(columns[0])
+    if n <= budget:
+        return np.arange(n)
+    points = np.column_stack([np.asarray(c, dtype=np.float64) for c in columns])
+    finite = np.flatnonzero(np.isfinite(points).all(axis=1))
+    points = points[finite]
+    if len(points) <= budget:
+        return finite
+    lo, span = points.min(axis=0), np.ptp(points, axis=0)
+    span[span == 0] = 1
+    dims = points.shape[1]
+    cells = max(1, int((budget / 2) ** (1 / dims)))
+    while True:
+        grid = np.minimum(((points - lo) / span * cells).astype(np.int64), cells - 1)
+        cell = np.ravel_multi_index(tuple(grid.T), (cells,) * dims)
+        order = np.lexsort((points[:, -1], cell))
+        boundary = cell[order][1:] != cell[order][:-1]
+        first, last = order[np.r_[True, boundary]], order[np.r_[boundary, True]]
+        keep = np.unique(np.concatenate([first, last, points.argmin(axis=0), points.argmax(axis=0)]))
+        if len(keep) <= budget or cells == 1:
+            return finite[keep]
+        cells = max(1, int(cells * 0.8))
+
+
+def stack_row_ranges(frame, columns, ranges, labels):
+    # Gathers the inclusive row ranges in one vectorized take: overlapping ranges simply repeat rows, and
+    # only `columns` plus the group label are copied. Invalid ranges are skipped.
+    spans = np.array([(start, end) for start, end in ranges], dtype=np.int64).reshape(-1, 2)
+    ok = (spans[:, 0] <= spans[:, 1]) & (spans[:, 1] < len(frame))
+    starts, lengths = spans[ok, 0], spans[ok, 1] - spans[ok, 0] + 1
+    offsets = np.repeat(np.cumsum(lengths) - lengths, lengths)
+    index = np.arange(lengths.sum()) - offsets + np.repeat(starts, lengths)
+    data = {col: frame[col].to_numpy().take(index) for col in dict.fromkeys(columns)}
+    data["group"] = np.repeat(np.asarray(labels, dtype=object)[ok], lengths)
+    return pd.DataFrame(data)
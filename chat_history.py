@@ -0,0 +1,65 @@
+"""Rolling chat history for the AI对话 tab.
+
+The conversation sent with each request is bounded by an estimated token
+budget. Once the turns since the last summary exceed it, the older ones
+are folded into a rolling summary (one extra request) and only the recent
+turns are sent verbatim after the system prompt and that summary.
+"""
+import re
+
+HISTORY_COMPACT_RATIO = 0.5  # Once over budget, older turns are summarized until the recent ones fit in this share
+SUMMARY_MAX_TOKENS = 800
+MESSAGE_OVERHEAD_TOKENS = 4  # Role and separators
+SUMMARY_PROMPT = ("请把下面的对话压缩成一份简洁的中文摘要，保留其中的工程参数、数值、结论和尚未解决的问题。"
+                  "如果给出了此前的摘要，请把它与新的对话合并成一份摘要。")
+_CJK_CHARS = re.compile(r"[\u2e80-\u9fff\uf900-\uffef]")
+
+
+def estimate_tokens(text):
+    # DeepSeek's rule of thumb, no tokenizer needed: ~0.6 token per CJK character, ~0.3 per other character.
+    cjk = len(_CJK_CHARS.findall(text))
+    return int(0.6 * cjk + 0.3 * (len(text) - cjk)) + MESSAGE_OVERHEAD_TOKENS
+
+
+def compaction_point(messages, start, budget, reserved=0):
+    # Index from which messages are sent verbatim. Stays at `start` while messages[start:] fit in `budget`
+    # minus `reserved`; otherwise moves forward to a user turn until they fit in HISTORY_COMPACT_RATIO of it,
+    # so summarizing happens every few turns rather than on each one. The newest message is always kept.
+    sizes = [estimate_tokens(m["content"]) for m in messages[start:]]
+    available = budget - reserved
+    total = sum(sizes)
+    if total <= available:
+        return start
+    i = 0
+    while i < len(sizes) - 1 and (total > available * HISTORY_COMPACT_RATIO or messages[start + i]["role"] != "user"):
+        total -= sizes[i]
+        i += 1
+    return start + i
+
+
+def summarize_turns(client, model, summary, turns):
+    # Folds `turns` into the rolling `summary` with one non-streamed request.
+    transcript = "\n".join(f"{'用户' if m['role'] == 'user' else '助手'}: {m['content']}" for m in turns)
+    if summary:
+        transcript = f"此前的摘要：\n{summary}\n\n新的对话：\n{transcript}"
+    response = client.chat.completions.create(
+        model=model,
+        messages=[{"role": "system", "content": SUMMARY_PROMPT}, {"role": "user", "content": transcript}],
+        max_tokens=SUMMARY_MAX_TOKENS,
+    )
+    summary = response.choices[0].message.content.strip()
+    while estimate_tokens(summary) > SUMMARY_MAX_TOKENS:  # Not every compatible server honours max_tokens
+        summary = summary[:int(len(summary) * 0.9)]
+    return summary
+
+
+def request_messages(messages, summary, start, context=None):
+    # System prompt, the rolling summary (if any), then messages[start:] verbatim, with `context` (a system
+    # message of retrieved records) placed just before the newest message.
+    head = [messages[0]]
+    if summary:
+        head.append({"role": "system", "content": f"此前对话的摘要：\n{summary}"})
+    body = messages[start:]
+    if context:
+        body = body[:-1] + [context] + body[-1:]
+    return [{"role": m["role"], "content": m["content"]} for m in head + body]
@@ -0,0 +1,100 @@
+"""Chat completions generated in background threads.
+
+A Generation streams one answer from an OpenAI-compatible client in a
+daemon thread and collects the text deltas in a buffer that the page polls,
+so the script thread never blocks on the network. Cancelling it closes
+the response right away, even while a read is waiting on a stalled
+stream, which aborts the upstream request. A semaphore passed in by the caller caps how many
+generations run at once in the process.
+"""
+import socket
+import threading
+
+
+def stream_deltas(stream):
+    # Text pieces of an OpenAI-style chat completion stream, skipping role-only and empty chunks.
+    for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+
+class Generation:
+    def __init__(self, client, model, messages, on_complete=None):
+        self._client = client
+        self._model = model
+        self._messages = messages
+        self._on_complete = on_complete
+        self._parts = []
+        self._cancelled = threading.Event()
+        self._done = threading.Event()
+        self._stream = None
+        self.error = None
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def text(self):
+        return "".join(self._parts)
+
+    def cancel(self):
+        # Closing the response from here also ends a read that is blocked on a stalled stream, so the
+        # worker thread and its slot are freed at once instead of at the client's read timeout.
+        self._cancelled.set()
+        stream = self._stream
+        if stream is not None:
+            _close_quietly(stream)
+
+    def _run(self, slots):
+        try:
+            # Leaving the with block closes the response, so a cancelled answer stops being generated upstream.
+            with self._client.chat.completions.create(model=self._model, messages=self._messages, stream=True) as stream:
+                self._stream = stream
+                if self._cancelled.is_set():
+                    return  # Cancelled while the request was sent; the with block closes the response
+                for delta in stream_deltas(stream):
+                    if self._cancelled.is_set():
+                        break
+                    self._parts.append(delta)
+            if not self._cancelled.is_set() and self._parts and self._on_complete is not None:
+                self._on_complete(self.text())
+        except Exception as e:
+            if not self._cancelled.is_set():
+                self.error = e  # Reading a response closed by cancel() fails; that is not an error
+        finally:
+            slots.release()
+            self._done.set()
+
+
+def _close_quietly(stream):
+    # httpx closes the connection, but a recv() blocked in another thread only returns once the socket is
+    # shut down, so that is done first when the network stream exposes it.
+    try:
+        network_stream = stream.response.extensions.get("network_stream")
+        sock = network_stream.get_extra_info("socket") if network_stream is not None else None
+        if sock is not None:
+            sock.shutdown(socket.SHUT_RDWR)
+    except (AttributeError, OSError):
+        pass
+    try:
+        stream.close()
+    except Exception:
+        pass
+
+
+def start(client, model, messages, slots, on_complete=None):
+    # A running Generation, or None when all of `slots` (a threading.BoundedSemaphore) are taken.
+    # `on_complete(text)` is called from the worker thread once a complete, non-empty answer has arrived.
+    if not slots.acquire(blocking=False):
+        return None
+    generation = Generation(client, model, messages, on_complete)
+    try:
+        threading.Thread(target=generation._run, args=(slots,), name="chat-generation", daemon=True).start()
+    except Exception:
+        slots.release()
+        raise
+    return generation
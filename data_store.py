@@ -0,0 +1,155 @@
+"""Workbook loading for the compressor database.
+
+Each source workbook is converted once into an Arrow IPC sidecar next to it
+(``data1/data1.xlsx`` -> ``data1/data1.arrow``).  The sidecar records the
+SHA-256 of the workbook it was built from and the sidecar format version,
+and is rebuilt only when either changes; otherwise it is memory-mapped
+instead of re-parsing Excel.
+
+Build all sidecars ahead of time with::
+
+    python data_store.py [workbook.xlsx ...]
+"""
+import contextlib
+import hashlib
+import os
+import sys
+import threading
+
+import pandas as pd
+import pyarrow as pa
+
+HEADER_ROWS = 3  # 参数大类 / 参数分组 / 参数名称
+DEFAULT_WORKBOOKS = ('./data1/data1.xlsx', './data/data.xlsx')
+SIDECAR_SUFFIX = '.arrow'
+SIDECAR_FORMAT_VERSION = 1  # Bump whenever read_workbook() produces different columns or types
+_SOURCE_HASH_KEY = b'source_sha256'
+_FORMAT_KEY = b'sidecar_format'
+
+# Chinese names of the columns whose header is in English, as engineers refer to them.
+COLUMN_LABELS_ZH = {
+    'Blade thickness': '叶片厚度',
+    'Tip clearance': '叶顶间隙',
+    'Outlet diameter of impeller': '叶轮出口直径',
+    'Hub diameter': '轮毂直径',
+    'Width of impeller': '叶轮出口宽度',
+    'Installation angle of blades at inlet': '叶片进口安装角',
+    'Installation angle of blades at outlet': '叶片出口安装角',
+    'Suction diameter of impeller': '叶轮进口直径',
+    'Number of blades': '叶片数',
+    'Inlet diameter of diffuser': '扩压器进口直径',
+    'Outlet radius of diffuser': '扩压器出口半径',
+    'Air Mass Flow Rate': '质量流量',
+    'compressor speed': '转速',
+    'compressor pressure ratio': '压比',
+    'Isentropic efficiency': '等熵效率',
+}
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def versioned(fn, path, *args):
+    # fn(path, mtime_ns, size, *args): passes the file's version along, so a cached `fn` misses once the file
+    # is edited or replaced, without hashing it on every call.
+    stat = os.stat(path)
+    return fn(path, stat.st_mtime_ns, stat.st_size, *args)
+
+
+@contextlib.contextmanager
+def atomic_output(path):
+    # Yields a temporary path to write to. It replaces `path` atomically when the block succeeds and is
+    # removed when it fails, so concurrent readers never see a half-written file.
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        yield tmp
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def sidecar_path(xlsx_path):
+    return os.path.splitext(xlsx_path)[0] + SIDECAR_SUFFIX
+
+
+def _column_names(header):
+    # The most specific non-empty header cell names the column (row 3, then row 2, then row 1).
+    names = []
+    for i in range(header.shape[1]):
+        labels = [v.strip() for v in header.iloc[::-1, i] if isinstance(v, str) and v.strip()]
+        name = labels[0] if labels else f"Unnamed: {i}"
+        if name in names:
+            name = f"{name}.{i}"
+        names.append(name)
+    return names
+
+
+def _typed_columns(frame):
+    # Arrow needs one type per column: text and mixed text/number columns are stored as strings.
+    typed = {}
+    for name, col in frame.items():
+        if col.dtype == object:
+            col = col.map(lambda v: v if pd.isna(v) else str(v)).astype('string')
+        typed[name] = col
+    return pd.DataFrame(typed)
+
+
+def read_workbook(xlsx_path):
+    raw = pd.read_excel(xlsx_path, header=None)
+    frame = raw.iloc[HEADER_ROWS:].reset_index(drop=True).infer_objects()
+    frame.columns = _column_names(raw.iloc[:HEADER_ROWS])
+    return _typed_columns(frame)
+
+
+def _sidecar_metadata(source_hash):
+    return {_SOURCE_HASH_KEY: source_hash.encode(), _FORMAT_KEY: str(SIDECAR_FORMAT_VERSION).encode()}
+
+
+def build_sidecar(xlsx_path, source_hash=None):
+    source_hash = source_hash or file_sha256(xlsx_path)
+    frame = read_workbook(xlsx_path)
+    table = pa.Table.from_pandas(frame, preserve_index=False)
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), **_sidecar_metadata(source_hash)})
+    target = sidecar_path(xlsx_path)
+    with atomic_output(target) as tmp:
+        with pa.OSFile(tmp, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    return frame
+
+
+def _read_sidecar(path, source_hash):
+    with pa.memory_map(path, 'r') as source:
+        reader = pa.ipc.open_file(source)
+        metadata = reader.schema.metadata or {}
+        if any(metadata.get(key) != value for key, value in _sidecar_metadata(source_hash).items()):
+            return None  # Built from another workbook version, or by an older read_workbook()
+        return reader.read_all().to_pandas()
+
+
+def load_workbook(xlsx_path):
+    source_hash = file_sha256(xlsx_path)
+    path = sidecar_path(xlsx_path)
+    if os.path.exists(path):
+        try:
+            frame = _read_sidecar(path, source_hash)
+            if frame is not None:
+                return frame
+        except (OSError, pa.ArrowInvalid) as e:
+            print(f"Ignoring unreadable sidecar '{path}': {e}")
+    try:
+        return build_sidecar(xlsx_path, source_hash)
+    except OSError as e:
+        print(f"Could not write sidecar '{path}': {e}. Reading the workbook directly.")
+        return read_workbook(xlsx_path)
+
+
+if __name__ == '__main__':
+    for xlsx in sys.argv[1:] or DEFAULT_WORKBOOKS:
+        build_sidecar(xlsx)
+        print(f"{xlsx} -> {sidecar_path(xlsx)}")
@@ -0,0 +1,90 @@
+"""Resized WebP derivatives of the gallery images in pic/.
+
+Each source PNG is rendered once per target width and stored under
+static/pic/ with the source's content hash in the file name, so a changed
+image gets a new derivative and an unchanged one is never re-encoded.
+
+Pre-render every derivative ahead of time with::
+
+    python image_cache.py
+"""
+import functools
+import glob
+import os
+import re
+
+from data_store import atomic_output, file_sha256, versioned
+
+SOURCE_DIR = 'pic'
+DERIVED_DIR = os.path.join('static', 'pic')  # Served by Streamlit at app/static/pic/ (server.enableStaticServing)
+STATIC_URL_PREFIX = 'app/static/pic/'
+DISPLAY_WIDTH = 1200
+THUMBNAIL_WIDTH = 320
+WEBP_QUALITY = 80
+DIGEST_LENGTH = 16  # Hex digits of the source hash in a derivative's name
+
+
+@functools.lru_cache(maxsize=256)
+def _source_digest(path, mtime_ns, size):
+    return file_sha256(path)[:DIGEST_LENGTH]
+
+
+def _natural_key(path):
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return (int(stem), stem) if stem.isdigit() else (float('inf'), stem)
+
+
+def discover_sources(exclude=()):
+    # Every PNG in pic/, in numeric order (2.png before 10.png), minus the names in `exclude`.
+    paths = glob.glob(os.path.join(SOURCE_DIR, '*.png'))
+    return sorted((p for p in paths if os.path.basename(p) not in exclude), key=_natural_key)
+
+
+def derivative_path(source, width):
+    stem = os.path.splitext(os.path.basename(source))[0]
+    digest = versioned(_source_digest, source)
+    return os.path.join(DERIVED_DIR, f"{stem}-{digest}-w{width}.webp")
+
+
+def _prune_stale(target, width):
+    # Earlier derivatives of the same source and width only: a glob on "{stem}-*" would also match other
+    # images whose name starts with the stem (blade-2-... for blade).
+    stem = os.path.basename(target).rsplit('-', 2)[0]
+    stale = re.compile(rf"{re.escape(stem)}-[0-9a-f]{{{DIGEST_LENGTH}}}-w{width}\.webp")
+    for name in os.listdir(DERIVED_DIR):
+        path = os.path.join(DERIVED_DIR, name)
+        if stale.fullmatch(name) and path != target:
+            os.remove(path)
+
+
+def render_derivative(source, width=DISPLAY_WIDTH):
+    target = derivative_path(source, width)
+    if os.path.exists(target):
+        return target
+    from PIL import Image  # Only needed on a cache miss, so it stays off the app's start-up path
+
+    os.makedirs(DERIVED_DIR, exist_ok=True)
+    with Image.open(source) as image:
+        image.load()
+        has_alpha = image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info
+        image = image.convert('RGBA' if has_alpha else 'RGB')
+        if has_alpha and image.getextrema()[3][0] == 255:
+            image = image.convert('RGB')  # Fully opaque screenshots do not need an alpha plane
+        if image.width > width:
+            image = image.resize((width, round(image.height * width / image.width)), Image.LANCZOS)
+        with atomic_output(target) as tmp:
+            image.save(tmp, 'WEBP', quality=WEBP_QUALITY)
+    _prune_stale(target, width)
+    return target
+
+
+def derivative_url(source, width=DISPLAY_WIDTH):
+    # File names are content-addressed; the ?v= query makes Tornado send a long max-age on top of the ETag.
+    name = os.path.basename(render_derivative(source, width))
+    return f"{STATIC_URL_PREFIX}{name}?v={name.rsplit('-', 2)[1]}"
+
+
+if __name__ == '__main__':
+    for source in discover_sources():
+        for width in (DISPLAY_WIDTH, THUMBNAIL_WIDTH):
+            print(f"{source} -> {render_derivative(source, width)}")
@@ -0,0 +1,118 @@
+"""Persistent cache of chat completions for repeated prompts.
+
+Answers are stored in a local SQLite database keyed by the model, the
+normalized prompt and a hash of the context sent with it (system prompt,
+conversation summary and earlier turns). Entries expire after a TTL, the
+least recently used ones are evicted beyond a size limit, and hit/miss
+counters are kept in the same database so every worker process shares them.
+
+Show the counters, or empty the cache, with::
+
+    python response_cache.py [--clear]
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import time
+import unicodedata
+from contextlib import closing
+
+CACHE_PATH = os.path.join('cache', 'chat_responses.sqlite3')
+DEFAULT_TTL = 7 * 24 * 3600  # Seconds
+DEFAULT_MAX_ENTRIES = 2000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    response TEXT NOT NULL,
+    created REAL NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used);
+CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+"""
+
+
+def normalize_prompt(text):
+    # Width variants (full-width punctuation and digits), case and runs of whitespace do not change the question.
+    return " ".join(unicodedata.normalize('NFKC', text).casefold().split())
+
+
+def cache_key(model, messages):
+    # The last message is the prompt; everything before it is the context the answer depends on.
+    context = json.dumps([[m["role"], m["content"]] for m in messages[:-1]], ensure_ascii=False)
+    digest = hashlib.sha256()
+    for part in (model, hashlib.sha256(context.encode()).hexdigest(), normalize_prompt(messages[-1]["content"])):
+        digest.update(part.encode())
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def _connect(path):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    conn = sqlite3.connect(path, timeout=5)
+    conn.execute('PRAGMA journal_mode=WAL')  # Readers in other workers do not block the writer
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def _count(conn, name):
+    conn.execute("INSERT INTO counters (name, value) VALUES (?, 1) "
+                 "ON CONFLICT (name) DO UPDATE SET value = value + 1", (name,))
+
+
+def lookup(key, path=CACHE_PATH, ttl=DEFAULT_TTL):
+    # The cached answer, or None on a miss. Cache failures count as misses, so chat keeps working without it.
+    now = time.time()
+    try:
+        with closing(_connect(path)) as conn, conn:
+            row = conn.execute("SELECT response, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None and now - row[1] <= ttl:
+                conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+                _count(conn, 'hits')
+                return row[0]
+            if row is not None:
+                conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            _count(conn, 'misses')
+    except (sqlite3.Error, OSError) as e:  # OSError: the cache directory cannot be created or written
+        print(f"Response cache lookup failed: {e}")
+    return None
+
+
+def store(key, response, path=CACHE_PATH, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES):
+    now = time.time()
+    try:
+        with closing(_connect(path)) as conn, conn:
+            conn.execute("INSERT OR REPLACE INTO responses (key, response, created, last_used) VALUES (?, ?, ?, ?)",
+                         (key, response, now, now))
+            conn.execute("DELETE FROM responses WHERE created < ?", (now - ttl,))
+            conn.execute("DELETE FROM responses WHERE key IN "
+                         "(SELECT key FROM responses ORDER BY last_used DESC LIMIT -1 OFFSET ?)", (max_entries,))
+    except (sqlite3.Error, OSError) as e:
+        print(f"Response cache store failed: {e}")
+
+
+def stats(path=CACHE_PATH):
+    # {'hits': ..., 'misses': ..., 'entries': ...}
+    try:
+        with closing(_connect(path)) as conn:
+            counters = dict(conn.execute("SELECT name, value FROM counters").fetchall())
+            entries = conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+    except (sqlite3.Error, OSError) as e:
+        print(f"Response cache stats failed: {e}")
+        counters, entries = {}, 0
+    return {'hits': counters.get('hits', 0), 'misses': counters.get('misses', 0), 'entries': entries}
+
+
+def clear(path=CACHE_PATH):
+    with closing(_connect(path)) as conn, conn:
+        conn.execute("DELETE FROM responses")
+        conn.execute("DELETE FROM counters")
+
+
+if __name__ == '__main__':
+    if '--clear' in sys.argv[1:]:
+        clear()
+    print(stats())
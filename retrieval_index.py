@@ -0,0 +1,157 @@
+"""Local retrieval index over the compressor database workbook.
+
+Every workbook row, and every column with its header categories, becomes a
+short text document. Documents are vectorized into character 1-2 gram counts
+(usable for Chinese without a tokenizer, and no network) with a hashing
+vectorizer, so one document's counts do not depend on the others: when the
+workbook changes only new or edited documents are re-vectorized, and the
+TF-IDF weights are refit over the stored counts.
+
+The index is saved next to the workbook (``data1/data1.xlsx`` ->
+``data1/data1.retrieval.pkl``) with the SHA-256 of the workbook it was built
+from. Build it ahead of time with::
+
+    python retrieval_index.py [workbook.xlsx ...]
+"""
+import hashlib
+import os
+import pickle
+import sys
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import HashingVectorizer, TfidfTransformer
+
+import data_store
+
+INDEX_SUFFIX = '.retrieval.pkl'
+NGRAM_RANGE = (1, 2)
+N_FEATURES = 2 ** 18
+DOCUMENT_MAX_CHARS = 400  # Longer documents are cut, so a few hits keep the prompt small
+
+
+def index_path(xlsx_path):
+    return os.path.splitext(xlsx_path)[0] + INDEX_SUFFIX
+
+
+def read_header(xlsx_path):
+    return pd.read_excel(xlsx_path, header=None, nrows=data_store.HEADER_ROWS)
+
+
+def _vectorizer():
+    return HashingVectorizer(analyzer='char', ngram_range=NGRAM_RANGE, n_features=N_FEATURES,
+                             alternate_sign=False, norm=None)
+
+
+def _clean(value):
+    if isinstance(value, float):
+        return f"{value:g}"
+    return " ".join(str(value).split())
+
+
+def _cut(text):
+    return text if len(text) <= DOCUMENT_MAX_CHARS else text[:DOCUMENT_MAX_CHARS - 1] + "…"
+
+
+def column_documents(header, names):
+    # "列 Tip clearance（叶顶间隙）: 影响空压机性能的参数 / 叶轮参数 / Tip clearance"; category cells are
+    # merged across columns, hence the ffill.
+    header = header.apply(lambda row: row.ffill(), axis=1) if len(header) else header
+    docs = []
+    for i, name in enumerate(names):
+        labels = [_clean(v) for v in header.iloc[:, i] if isinstance(v, str) and v.strip()] if i < header.shape[1] else []
+        alias = data_store.COLUMN_LABELS_ZH.get(name)
+        title = f"{name}（{alias}）" if alias else f"{name}"
+        docs.append(_cut(f"列 {title}: {' / '.join(dict.fromkeys(labels + [str(name)]))}"))
+    return docs
+
+
+def row_documents(frame):
+    # "第140行: 论文类型=国外论文; Tip clearance=0.3; ..." with sheet row numbers as in Excel.
+    columns = [str(c) for c in frame.columns]
+    docs = []
+    for offset, values in enumerate(frame.itertuples(index=False, name=None)):
+        fields = "; ".join(f"{col}={_clean(v)}" for col, v in zip(columns, values) if not pd.isna(v))
+        docs.append(_cut(f"第{offset + data_store.HEADER_ROWS + 1}行: {fields}"))
+    return docs
+
+
+class RetrievalIndex:
+    def __init__(self, source_hash, documents, counts):
+        self.source_hash = source_hash
+        self.documents = documents
+        self.counts = counts.tocsr().astype(np.float32)
+        self._digests = [hashlib.sha1(doc.encode()).hexdigest() for doc in documents]
+        self._vectorizer = _vectorizer()
+        self._tfidf = TfidfTransformer(sublinear_tf=True).fit(self.counts)
+        self._matrix = self._tfidf.transform(self.counts).T.tocsr()  # Features x documents, rows l2-normalized
+
+    def search(self, query, k=5, min_score=0.1):
+        # [(cosine score, document)] for the best `k` documents scoring at least `min_score`.
+        query_vector = self._tfidf.transform(self._vectorizer.transform([query]))
+        scores = (query_vector @ self._matrix).toarray().ravel()
+        k = min(k, len(scores))
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(float(scores[i]), self.documents[i]) for i in top if scores[i] >= min_score]
+
+    def __getstate__(self):
+        return {'source_hash': self.source_hash, 'documents': self.documents, 'counts': self.counts}
+
+    def __setstate__(self, state):
+        self.__init__(state['source_hash'], state['documents'], state['counts'])
+
+
+def build_index(xlsx_path, frame, source_hash, previous=None):
+    # Counts of documents already in `previous` are reused; only new or changed documents are vectorized.
+    documents = column_documents(read_header(xlsx_path), frame.columns) + row_documents(frame)
+    known = {} if previous is None else {d: i for i, d in enumerate(previous._digests)}
+    digests = [hashlib.sha1(doc.encode()).hexdigest() for doc in documents]
+    missing = [i for i, d in enumerate(digests) if d not in known]
+    new_counts = _vectorizer().transform([documents[i] for i in missing])
+    if previous is None:
+        counts = new_counts
+    else:
+        reused = len(previous.documents)
+        position = dict(zip(missing, range(reused, reused + len(missing))))
+        order = [known[d] if d in known else position[i] for i, d in enumerate(digests)]
+        counts = sp.vstack([previous.counts, new_counts]).tocsr()[order]
+    print(f"Retrieval index for '{xlsx_path}': vectorized {len(missing)} of {len(documents)} documents.")
+    return RetrievalIndex(source_hash, documents, counts)
+
+
+def _save(index, path):
+    with data_store.atomic_output(path) as tmp, open(tmp, 'wb') as f:
+        pickle.dump(index, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def load_index(xlsx_path, frame=None):
+    # The saved index if it was built from this exact workbook, otherwise an incremental rebuild that is saved.
+    source_hash = data_store.file_sha256(xlsx_path)
+    path = index_path(xlsx_path)
+    previous = None
+    if os.path.exists(path):
+        try:
+            with open(path, 'rb') as f:
+                previous = pickle.load(f)
+            if previous.source_hash == source_hash:
+                return previous
+        except (OSError, pickle.UnpicklingError, AttributeError, EOFError) as e:
+            print(f"Ignoring unreadable retrieval index '{path}': {e}")
+            previous = None
+    frame = data_store.load_workbook(xlsx_path) if frame is None else frame
+    index = build_index(xlsx_path, frame, source_hash, previous)
+    try:
+        _save(index, path)
+    except OSError as e:
+        print(f"Could not write retrieval index '{path}': {e}")
+    return index
+
+
+if __name__ == '__main__':
+    for xlsx in sys.argv[1:] or data_store.DEFAULT_WORKBOOKS:
+        load_index(xlsx)
+        print(f"{xlsx} -> {index_path(xlsx)}")
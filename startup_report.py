@@ -0,0 +1,99 @@
+"""Import-time report for streamlit_app4.py.
+
+Splits the app's imports into the ones a worker pays for on start-up
+(module level) and the ones deferred to the tab or chart that uses them,
+then times each in fresh interpreters:
+
+* start-up modules are imported one after another, in source order, so
+  each time is that module's cost on top of the ones before it;
+* each deferred module is imported after all start-up modules, i.e. what
+  the first page that needs it adds to its latency.
+
+Run from the repository root::
+
+    python startup_report.py [--repeat 3] [--json report.json]
+"""
+import argparse
+import ast
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+APP_PATH = 'streamlit_app4.py'
+
+_TIMER = '''
+import importlib, json, sys, time
+timings = []
+for group in json.loads(sys.argv[1]):
+    start = time.perf_counter()
+    for name in group:
+        importlib.import_module(name)
+    timings.append(time.perf_counter() - start)
+print(json.dumps(timings))
+'''
+
+
+def _imported_modules(node):
+    if isinstance(node, ast.Import):
+        return [alias.name for alias in node.names]
+    if isinstance(node, ast.ImportFrom) and node.level == 0:
+        return [node.module]
+    return []
+
+
+def collect_imports(path=APP_PATH):
+    # (start-up modules, deferred modules), each in source order without duplicates.
+    with open(path, encoding='utf-8') as f:
+        tree = ast.parse(f.read(), filename=path)
+    eager, lazy = [], []
+    for statement in tree.body:
+        if isinstance(statement, (ast.Import, ast.ImportFrom)):
+            eager.extend(_imported_modules(statement))
+        else:
+            for node in ast.walk(statement):
+                lazy.extend(_imported_modules(node))
+    eager = list(dict.fromkeys(eager))
+    return eager, [name for name in dict.fromkeys(lazy) if name not in eager]
+
+
+def _time_groups(groups, cwd):
+    result = subprocess.run([sys.executable, '-c', _TIMER, json.dumps(groups)], cwd=cwd,
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def measure(path=APP_PATH, repeat=3):
+    # Median seconds per module over `repeat` fresh interpreters.
+    cwd = os.path.dirname(os.path.abspath(path))
+    eager, lazy = collect_imports(path)
+    runs = [_time_groups([[name] for name in eager], cwd) for _ in range(repeat)]
+    startup = {name: statistics.median(run[i] for run in runs) for i, name in enumerate(eager)}
+    deferred = {}
+    for name in lazy:
+        deferred[name] = statistics.median(_time_groups([eager, [name]], cwd)[1] for _ in range(repeat))
+    return {'startup': startup, 'startup_total': sum(startup.values()), 'deferred': deferred}
+
+
+def _print_report(report):
+    print(f"{'start-up imports':<40}{'seconds':>10}")
+    for name, seconds in report['startup'].items():
+        print(f"  {name:<38}{seconds:>10.3f}")
+    print(f"  {'total':<38}{report['startup_total']:>10.3f}")
+    print(f"\n{'deferred imports (first use)':<40}{'seconds':>10}")
+    for name, seconds in sorted(report['deferred'].items(), key=lambda item: -item[1]):
+        print(f"  {name:<38}{seconds:>10.3f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--app', default=APP_PATH)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--json', help="also write the report to this file")
+    args = parser.parse_args()
+    report = measure(args.app, args.repeat)
+    _print_report(report)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
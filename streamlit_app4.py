@@ -1,50 +1,701 @@
 import streamlit as st
-import matplotlib.tri as tri
 import os
 import pandas as pd
-import matplotlib.pyplot as plt
 import numpy as np
-import altair as alt
-import plotly.graph_objects as go
-from bokeh.models import HoverTool
-from bokeh.models import ColumnDataSource
-from bokeh.layouts import gridplot
-from bokeh.models import BoxSelectTool, LassoSelectTool
-from sklearn.preprocessing import MinMaxScaler
-import matplotlib
-import matplotlib.font_manager as fm
-import seaborn as sns
-from PIL import Image
-from streamlit.components.v1 import html
-from sklearn.preprocessing import StandardScaler
-from matplotlib.patches import Rectangle
-import plotly.figure_factory as ff
-from bokeh.plotting import figure
-from bokeh.sampledata.penguins import data as bokeh_penguins_data
-from bokeh.transform import factor_cmap, factor_mark
-from openai import OpenAI
+import data_store
+import chart_kernels
+import chat_history
+import chat_worker
+import image_cache
+import response_cache
+import upload_data
+import base64
+import functools
+import hashlib
+import io
+import sys
+import threading
+import time
+from dataclasses import dataclass
+
+# Heavy libraries (matplotlib, seaborn, plotly.graph_objects, bokeh, sklearn, openai) are imported inside
+# the tab or chart that uses them, so a fresh worker only pays for what the first page draws.
+# `python startup_report.py` prints the per-module import cost of both groups.
 
 # ---- FONT SETUP FOR MATPLOTLIB ----
 font_path = "SimHei.ttf"  # Relative path from repository root
-font_msg = ""
-if os.path.exists(font_path):
-    try:
-        fm.fontManager.addfont(font_path)
-        plt.rcParams['font.sans-serif'] = ['SimHei'] + plt.rcParams['font.sans-serif']
-        font_msg = f"SimHei font loaded successfully from '{font_path}'."
-        print(font_msg)  # For logs
-    except Exception as e:
-        font_msg = f"Error loading SimHei font: {e}. Falling back to default font. Chinese characters may not display."
-        print(font_msg)  # For logs
+
+
+@st.cache_resource(show_spinner=False)
+def setup_matplotlib():
+    # rcParams and the font manager are process-wide, so SimHei is registered once per process, on the
+    # first chart that needs matplotlib. Returns the SimHei FontProperties, or None if it is unavailable.
+    import matplotlib.font_manager as fm
+    import matplotlib.pyplot as plt
+
+    if os.path.exists(font_path):
+        try:
+            fm.fontManager.addfont(font_path)
+            plt.rcParams['font.sans-serif'] = ['SimHei'] + plt.rcParams['font.sans-serif']
+            print(f"SimHei font loaded successfully from '{font_path}'.")  # For logs
+        except Exception as e:
+            print(f"Error loading SimHei font: {e}. Falling back to default font. Chinese characters may not display.")  # For logs
+            plt.rcParams['font.sans-serif'] = ['sans-serif']  # Fallback to default
+    else:
+        print(f"SimHei.ttf not found at '{font_path}'. Falling back to default font. Chinese characters may not display.")  # For logs
         plt.rcParams['font.sans-serif'] = ['sans-serif']  # Fallback to default
-else:
-    font_msg = f"SimHei.ttf not found at '{font_path}'. Falling back to default font. Chinese characters may not display."
-    print(font_msg)  # For logs
-    plt.rcParams['font.sans-serif'] = ['sans-serif']  # Fallback to default
 
-plt.rcParams['axes.unicode_minus'] = False  # Correctly display minus sign
+    plt.rcParams['axes.unicode_minus'] = False  # Correctly display minus sign
+
+    if os.path.exists(font_path):
+        try:
+            return fm.FontProperties(fname=font_path)
+        except Exception as e:
+            print(f"Could not load FontProperties for SimHei: {e}")  # For logs
+    return None
+
+
+# Plotly charts only need to know whether SimHei is available, which does not require matplotlib.
+simhei_available = os.path.exists(font_path)
 # ---- END FONT SETUP ----
 
+# ---- WORKBOOK LOADING ----
+WORKBOOK_PATH = './data1/data1.xlsx'
+OVERVIEW_ROW_BLOCKS = ((137, 53), (437, 17), (521, 50))  # (sheet row, row count) shown in the 3D overview
+SPEED_COL = 'compressor speed'
+FLOW_COL = 'Air Mass Flow Rate'
+EFFICIENCY_COL = 'Isentropic efficiency'
+PRESSURE_RATIO_COL = 'compressor pressure ratio'
+
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def _cached_workbook(path, mtime_ns, size):
+    return data_store.load_workbook(path)
+
+
+def load_workbook(path=WORKBOOK_PATH):
+    # Loaded once per file version (mtime + size) and shared across reruns and sessions; a fresh
+    # process maps the Arrow sidecar instead of re-parsing Excel. Callers must not mutate the frame.
+    return data_store.versioned(_cached_workbook, path)
+
+
+def overview_series(workbook, column):
+    blocks = [workbook[column].iloc[start - data_store.HEADER_ROWS:start - data_store.HEADER_ROWS + count]
+              for start, count in OVERVIEW_ROW_BLOCKS]
+    return pd.to_numeric(pd.concat(blocks, ignore_index=True), errors='coerce')
+# ---- END WORKBOOK LOADING ----
+
+# ---- IMAGE GALLERY ----
+@st.cache_data(show_spinner=False, max_entries=256)
+def _derivative_data_uri(path):
+    # Derivative file names contain the source hash, so the path alone is a safe cache key.
+    with open(path, 'rb') as f:
+        return "data:image/webp;base64," + base64.b64encode(f.read()).decode()
+
+
+OPERATION_EXAMPLE_IMAGES = ("30.png", "31.png", "32.png", "33.png")
+GALLERY_PAGE_SIZES = (5, 10, 20)
+
+
+def _gallery_img_attrs(source):
+    if st.get_option("server.enableStaticServing"):
+        # The browser fetches (and caches) the files itself, lazily, instead of receiving them over the websocket.
+        display = image_cache.derivative_url(source, image_cache.DISPLAY_WIDTH)
+        thumb = image_cache.derivative_url(source, image_cache.THUMBNAIL_WIDTH)
+        return (f'src="{display}" srcset="{thumb} {image_cache.THUMBNAIL_WIDTH}w, {display} {image_cache.DISPLAY_WIDTH}w" '
+                f'sizes="(max-width: {image_cache.DISPLAY_WIDTH}px) 100vw, {image_cache.DISPLAY_WIDTH}px" loading="lazy"')
+    return f'src="{_derivative_data_uri(image_cache.render_derivative(source, image_cache.DISPLAY_WIDTH))}"'
+
+
+def show_gallery_image(full_path, caption, width=image_cache.DISPLAY_WIDTH):
+    # Serves pre-rendered WebP derivatives. st.image would re-encode the full-size PNG on every rerun.
+    st.markdown(
+        f"""
+        <figure style="margin: 0 0 1rem 0;">
+            <img {_gallery_img_attrs(full_path)} alt="{caption}" style="width: {width}px; max-width: 100%;">
+            <figcaption style="text-align: center; font-size: 14px;">{caption}</figcaption>
+        </figure>
+        """,
+        unsafe_allow_html=True
+    )
+
+
+def show_gallery(sources, caption_prefix, key):
+    if not sources:
+        st.warning(f"图片文件夹 {image_cache.SOURCE_DIR} 中没有找到图片。")
+        return
+    size_col, page_col = st.columns(2)
+    with size_col:
+        page_size = st.selectbox("每页图片数", GALLERY_PAGE_SIZES, index=0, key=f"{key}_page_size")
+    page_count = -(-len(sources) // page_size)
+    with page_col:
+        # Keyed by page size so a stale page number never exceeds the new page count.
+        page = st.number_input(f"页码 (共 {page_count} 页)", min_value=1, max_value=page_count, value=1,
+                               key=f"{key}_page_{page_size}")
+    for source in sources[(page - 1) * page_size:page * page_size]:
+        try:
+            show_gallery_image(source, f"{caption_prefix}: {os.path.basename(source)}")
+        except Exception as e:
+            st.error(f"加载图片 {os.path.basename(source)} 时出错: {e}")
+# ---- END IMAGE GALLERY ----
+
+# ---- UPLOADED DATA ----
+UPLOAD_HEADER_ROW = 2
+
+
+@st.cache_resource(show_spinner="正在解析上传的文件...", max_entries=8)
+def _ingest_upload(content_hash, file_name, header, _data):
+    # Keyed by content hash and parse options; the raw bytes (_data) are excluded from hashing.
+    raw = upload_data.read_upload(file_name, header, _data)
+    if raw is None:
+        return None
+    return upload_data.ingest(content_hash, raw)
+
+
+def load_upload(uploaded_file, header=UPLOAD_HEADER_ROW):
+    # file_id only changes when a different file is uploaded, so the content is hashed once per upload.
+    file_id, content_hash = st.session_state.get("upload_digest", (None, None))
+    if file_id != uploaded_file.file_id:
+        content_hash = hashlib.sha256(uploaded_file.getbuffer()).hexdigest()
+        st.session_state.upload_digest = (uploaded_file.file_id, content_hash)
+    return _ingest_upload(content_hash, uploaded_file.name, header, uploaded_file.getvalue())
+# ---- END UPLOADED DATA ----
+
+# ---- CONTOUR ENGINE ----
+CONTOUR_GRID_SIZES = (50, 100, 200, 400)
+CONTOUR_INTERPOLATORS = {"线性插值": "linear", "三次插值": "cubic"}
+
+
+@st.cache_resource(show_spinner="正在进行三角剖分...", max_entries=16)
+def _contour_mesh(content_hash, x_col, y_col, z_col, _dataset):
+    # One Delaunay triangulation per (data, x, y, z); shared by the interpolated grid and the tricontour plot.
+    import matplotlib.tri as tri
+
+    cols = [x_col, y_col, z_col]
+    points = _dataset.numeric(cols)[_dataset.valid_rows(cols)]
+    if len(points) < 3:
+        return None
+    return tri.Triangulation(points[x_col].to_numpy(float), points[y_col].to_numpy(float)), points[z_col].to_numpy(float)
+
+
+@st.cache_resource(show_spinner="正在计算插值网格...", max_entries=16)
+def _contour_grid(content_hash, x_col, y_col, z_col, grid_size, method, _dataset):
+    import matplotlib.tri as tri
+
+    triang, z = _contour_mesh(content_hash, x_col, y_col, z_col, _dataset)
+    xi = np.linspace(triang.x.min(), triang.x.max(), grid_size)
+    yi = np.linspace(triang.y.min(), triang.y.max(), grid_size)
+    if method == "cubic":
+        interpolator = tri.CubicTriInterpolator(triang, z, kind='geom')
+    else:
+        interpolator = tri.LinearTriInterpolator(triang, z)
+    Xi, Yi = np.meshgrid(xi, yi)
+    return xi, yi, interpolator(Xi, Yi)
+
+
+def contour_engine(dataset, x_col, y_col, z_col, grid_size=100, method="linear"):
+    # Returns (triangulation, z, xi, yi, zi), or None when fewer than 3 valid points remain.
+    mesh = _contour_mesh(dataset.content_hash, x_col, y_col, z_col, dataset)
+    if mesh is None:
+        return None
+    xi, yi, zi = _contour_grid(dataset.content_hash, x_col, y_col, z_col, grid_size, method, dataset)
+    return mesh + (xi, yi, zi)
+# ---- END CONTOUR ENGINE ----
+
+# ---- CORRELATION HEATMAP ----
+HEATMAP_ANNOTATE_MAX_CELLS = 400  # Above this the per-cell matplotlib text artists dominate render time
+
+
+def top_k_correlation(corr, k):
+    # Keep the k columns with the strongest mean |r| against the others, in their original order.
+    if not k or k >= len(corr):
+        return corr
+    strength = corr.abs().where(~np.eye(len(corr), dtype=bool)).mean()
+    keep = set(strength.sort_values(ascending=False, na_position='last').index[:max(k, 2)])
+    cols = [c for c in corr.columns if c in keep]
+    return corr.loc[cols, cols]
+
+
+def cluster_order_correlation(corr):
+    # Average-linkage clustering on 1 - |r| so strongly related columns end up next to each other.
+    if len(corr) < 3:
+        return corr
+    from scipy.cluster.hierarchy import leaves_list, linkage
+    from scipy.spatial.distance import squareform
+    distance = 1 - corr.abs().fillna(0).to_numpy()
+    distance = np.clip((distance + distance.T) / 2, 0, None)
+    np.fill_diagonal(distance, 0)
+    order = leaves_list(linkage(squareform(distance, checks=False), method='average'))
+    return corr.iloc[order, order]
+
+
+def correlation_heatmap_figure(corr, cbarlabel):
+    # One vectorized heatmap trace; values are read on hover instead of from thousands of text artists.
+    import plotly.graph_objects as go
+
+    cols = [str(c) for c in corr.columns]
+    fig = go.Figure(go.Heatmap(
+        z=corr.to_numpy(), x=cols, y=cols, zmin=-1, zmax=1, colorscale='YlGn',
+        colorbar=dict(title=cbarlabel), hovertemplate="%{y} / %{x}: %{z:.3f}<extra></extra>"
+    ))
+    fig.update_layout(
+        height=min(1400, max(500, 14 * len(cols))), margin=dict(l=20, r=20, t=20, b=20),
+        xaxis=dict(side='top', tickangle=-30), yaxis=dict(autorange='reversed')
+    )
+    return fig
+# ---- END CORRELATION HEATMAP ----
+
+# ---- CORRELATION SERVICE ----
+@dataclass(frozen=True)
+class CorrelationMatrices:
+    pearson: pd.DataFrame
+    spearman: pd.DataFrame
+    counts: pd.DataFrame  # Pairwise-complete sample count behind every coefficient
+    spearman_exact: bool  # False when the re-ranking budget was exceeded (see chart_kernels.spearman_matrix)
+
+
+@st.cache_resource(show_spinner="正在计算相关系数矩阵...", max_entries=8)
+def _correlation_matrices(content_hash, _dataset):
+    cols = [c for c in _dataset.frame.columns if _dataset.valid[c].any()]
+    values = _dataset.numeric_array(cols)  # float32; the kernels upcast one row chunk at a time
+    mask = _dataset.valid[cols].to_numpy()
+    pearson, counts = chart_kernels.pairwise_pearson(values, mask)
+    spearman, exact = chart_kernels.spearman_matrix(values, mask, counts)
+    return CorrelationMatrices(
+        pd.DataFrame(pearson, index=cols, columns=cols),
+        pd.DataFrame(spearman, index=cols, columns=cols),
+        pd.DataFrame(counts.astype(np.int64), index=cols, columns=cols),
+        exact
+    )
+
+
+def correlation_matrices(dataset):
+    # Full Pearson/Spearman matrices per upload; the UI only slices them, so selection changes are free.
+    return _correlation_matrices(dataset.content_hash, dataset)
+# ---- END CORRELATION SERVICE ----
+
+# ---- DENSITY BACKEND ----
+def distplot_figure(summaries, group_labels, colors):
+    # Same traces and layout as ff.create_distplot, built from chart_kernels.density_summary() results.
+    import plotly.graph_objects as go
+
+    bars, curves, rugs = [], [], []
+    for summary, label, color in zip(summaries, group_labels, colors):
+        edges = summary["edges"]
+        bars.append(go.Bar(
+            x=(edges[:-1] + edges[1:]) / 2, y=summary["density"], width=np.diff(edges), xaxis="x1", yaxis="y1",
+            name=label, legendgroup=label, marker=dict(color=color), opacity=0.7
+        ))
+        if summary["kde"] is not None:
+            curves.append(go.Scatter(
+                x=summary["kde"][0], y=summary["kde"][1], xaxis="x1", yaxis="y1", mode="lines",
+                name=label, legendgroup=label, showlegend=False, marker=dict(color=color)
+            ))
+        rugs.append(go.Scatter(
+            x=summary["rug"], y=[label] * len(summary["rug"]), xaxis="x1", yaxis="y2", mode="markers",
+            name=label, legendgroup=label, showlegend=False, marker=dict(color=color, symbol="line-ns-open")
+        ))
+    layout = go.Layout(
+        barmode="overlay", bargap=0, hovermode="closest", legend=dict(traceorder="reversed"),
+        xaxis1=dict(domain=[0.0, 1.0], anchor="y2", zeroline=False),
+        yaxis1=dict(domain=[0.35, 1], anchor="free", position=0.0),
+        yaxis2=dict(domain=[0, 0.25], anchor="x1", dtick=1, showticklabels=False)
+    )
+    return go.Figure(data=bars + curves + rugs, layout=layout)
+
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def _column_density(content_hash, col_name, normalize, bin_size, _dataset):
+    # Cached per (upload, column, normalization, bin size); None when the column has no numbers.
+    series = _dataset.numeric([col_name])[col_name][_dataset.valid[col_name].to_numpy()].to_numpy(np.float64)
+    if series.size == 0:
+        return None
+    if normalize:
+        from sklearn.preprocessing import StandardScaler
+        series = StandardScaler().fit_transform(series.reshape(-1, 1)).ravel()
+    return chart_kernels.density_summary(series, bin_size)
+
+
+def column_density(dataset, col_name, normalize=False, bin_size=0.2):
+    return _column_density(dataset.content_hash, col_name, normalize, bin_size, dataset)
+
+
+HOME_DISTRIBUTION_COLUMNS = ((FLOW_COL, "质量流量"), (PRESSURE_RATIO_COL, "压比"), (EFFICIENCY_COL, "等熵效率"), (SPEED_COL, "转速"))
+HOME_DISTRIBUTION_POINTS = 200  # KDE grid and rug size of the small home-page tile
+
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def _workbook_distributions(path, mtime_ns, size, columns):
+    # Standardized, so columns in different units share one axis. Computed once per workbook version,
+    # keyed like the cached workbook itself; columns without numbers are left out.
+    workbook = _cached_workbook(path, mtime_ns, size)
+    summaries = []
+    for col_name, label in columns:
+        if col_name not in workbook.columns:
+            continue
+        values = pd.to_numeric(workbook[col_name], errors='coerce').dropna().to_numpy(np.float64)
+        if values.size < 2 or values.std() == 0:
+            continue
+        values = (values - values.mean()) / values.std()
+        summaries.append((label, chart_kernels.density_summary(values, 0.2, HOME_DISTRIBUTION_POINTS, HOME_DISTRIBUTION_POINTS)))
+    return summaries
+
+
+def workbook_distributions(columns=HOME_DISTRIBUTION_COLUMNS, path=WORKBOOK_PATH):
+    # [(label, density_summary)] for the given (column, label) pairs of the database workbook.
+    return data_store.versioned(_workbook_distributions, path, columns)
+# ---- END DENSITY BACKEND ----
+
+# ---- LEVEL OF DETAIL ----
+SCATTER3D_POINT_BUDGET = 5000
+BOKEH_POINT_BUDGET = 20000
+
+
+def level_of_detail(frame, columns, budget, key, zoom_label):
+    # Above the budget, a range slider on columns[0] acts as zoom: the narrower slice is decimated again
+    # with the same budget, so zooming in shows the data at a higher resolution.
+    if len(frame) <= budget:
+        return frame
+    zoom_values = frame[columns[0]]
+    lo, hi = float(zoom_values.min()), float(zoom_values.max())
+    if lo < hi:
+        zoom = st.slider(zoom_label, lo, hi, (lo, hi), key=f"{key}_{lo}_{hi}")
+        frame = frame[zoom_values.between(*zoom)]
+    kept = frame.iloc[chart_kernels.decimate_indices([frame[c] for c in dict.fromkeys(columns)], budget)]
+    st.caption(f"数据点较多：显示 {len(kept)}/{len(frame)} 个代表点（网格抽稀，保留极值）。")
+    return kept
+# ---- END LEVEL OF DETAIL ----
+
+# ---- RANGE COMPARISON ----
+RANGE_MARKERS = ('hex', 'circle_x', 'triangle', 'square', 'diamond', 'inverted_triangle', 'star', 'circle_cross', 'square_x', 'asterisk')
+CHINESE_NUMERALS = "一二三四五六七八九十"
+# ---- END RANGE COMPARISON ----
+
+# ---- DONUT CHARTS ----
+DONUT_DPI = 200  # Same resolution as st.pyplot
+PYPLOT_MAX_OPEN_FIGURES = 8  # Per process
+
+
+def bound_pyplot_figures(limit=PYPLOT_MAX_OPEN_FIGURES):
+    # A rerun interrupted between plt.subplots and plt.close leaves its figure in pyplot's registry for the
+    # life of the process; close the oldest ones beyond `limit`. Does nothing until pyplot has been imported.
+    plt = sys.modules.get("matplotlib.pyplot")
+    if plt is None:
+        return
+    fignums = plt.get_fignums()
+    for num in fignums[:max(0, len(fignums) - limit)]:
+        plt.close(num)
+
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def donut_png(counts, palette, font_color='white', hole_color='#0d1e56', simhei=simhei_available):
+    # Rendered once per (value counts, theme) to PNG bytes; the figure is closed before returning.
+    # `counts` is a tuple of (label, count); the largest slice is named in the centre and the next three
+    # in the legend. Colours are sampled from `palette` exactly as seaborn.color_palette does.
+    import matplotlib
+    import matplotlib.font_manager as fm
+    import matplotlib.pyplot as plt
+
+    font_prop = setup_matplotlib() if simhei else None
+    values, labels = zip(*sorted(((value, label) for label, value in counts), reverse=True))
+    colors = matplotlib.colormaps[palette](np.linspace(0, 1, len(values) + 2)[1:-1])[:, :3]
+
+    fig, ax = plt.subplots(figsize=(2.8, 2.8))
+    try:
+        fig.patch.set_alpha(0.0)
+        ax.patch.set_alpha(0.0)
+        textprops = {'fontsize': 10, 'color': 'white'}
+        if font_prop:
+            textprops['fontproperties'] = font_prop
+        wedges, _, autotexts = ax.pie(values, autopct='%1.1f%%', startangle=90, colors=colors, pctdistance=0.85,
+                                      textprops=textprops, wedgeprops=dict(width=0.4, edgecolor=hole_color))
+        for autotext, color in zip(autotexts, colors):
+            autotext.set_color('black' if color.mean() > 0.6 else 'white')
+            if font_prop:
+                autotext.set_fontproperties(font_prop)
+
+        total = sum(values)
+        center_args = {'ha': 'center', 'va': 'center', 'color': font_color, 'weight': 'bold'}
+        if font_prop:
+            center_args['fontproperties'] = font_prop
+        ax.text(0, 0.1, f"{labels[0]}", fontsize=12, **center_args)
+        ax.text(0, -0.15, f"{(values[0] / total) * 100 if total > 0 else 0:.1f}%", fontsize=14, **center_args)
+
+        ax.axis('equal')
+        if len(labels) > 1:
+            ax.legend(wedges[1:4], [f"{label}" for label in labels[1:4]],
+                      loc="lower center", bbox_to_anchor=(0.5, -0.25),
+                      labelcolor=font_color, facecolor='none', edgecolor='none', ncol=2,
+                      prop=fm.FontProperties(fname=font_path, size=10) if font_prop else {'size': 10})
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format="png", dpi=DONUT_DPI, bbox_inches="tight")
+        return buffer.getvalue()
+    finally:
+        plt.close(fig)
+# ---- END DONUT CHARTS ----
+
+# ---- CHAT STREAMING ----
+STREAM_UPDATES_PER_SECOND = 15
+STREAM_CURSOR = "▌"
+REPLAY_CHUNK_CHARS = 16
+
+
+def replay_deltas(text, chunk_chars=REPLAY_CHUNK_CHARS):
+    # A cached answer cut into stream-sized pieces, so it goes through the same rendering as a live one.
+    for i in range(0, len(text), chunk_chars):
+        yield text[i:i + chunk_chars]
+
+
+def render_stream(deltas, placeholder, updates_per_second=STREAM_UPDATES_PER_SECOND):
+    # Coalesces deltas and redraws `placeholder` at most `updates_per_second` times a second (the first
+    # delta is drawn immediately). Pieces are collected in a list and joined only when drawn.
+    interval = 1.0 / updates_per_second
+    parts, next_draw = [], 0.0
+    for delta in deltas:
+        parts.append(delta)
+        now = time.monotonic()
+        if now >= next_draw:
+            parts = ["".join(parts)]
+            placeholder.markdown(parts[0] + STREAM_CURSOR)
+            next_draw = now + interval
+    text = "".join(parts)
+    placeholder.markdown(text)
+    return text
+# ---- END CHAT STREAMING ----
+
+# ---- CHAT CLIENT ----
+DEEPSEEK_BASE_URL = os.environ.get("DEEPSEEK_BASE_URL", "https://api.deepseek.com/v1")  # Any OpenAI-compatible server, e.g. a local stub
+DEEPSEEK_MODEL = os.environ.get("DEEPSEEK_MODEL", "deepseek-chat")
+CHAT_CONNECT_TIMEOUT = float(os.environ.get("DEEPSEEK_CONNECT_TIMEOUT", 10))  # Seconds
+CHAT_READ_TIMEOUT = float(os.environ.get("DEEPSEEK_READ_TIMEOUT", 120))  # Seconds between streamed bytes
+CHAT_MAX_RETRIES = int(os.environ.get("DEEPSEEK_MAX_RETRIES", 3))  # Exponential backoff on connection errors, 429 and 5xx
+CHAT_POOL_CONNECTIONS = 32  # Per (API key, base URL), shared by every session using it
+CHAT_KEEPALIVE_EXPIRY = 60  # Seconds an idle connection is kept open
+
+
+@st.cache_resource(show_spinner=False, max_entries=64)
+def chat_client(api_key, base_url=DEEPSEEK_BASE_URL):
+    # One client per (API key, base URL) and process, shared across reruns and sessions. Its httpx pool
+    # keeps connections alive, so only the first request pays for DNS, TCP and TLS setup.
+    import httpx
+    from openai import OpenAI
+
+    http_client = httpx.Client(
+        timeout=httpx.Timeout(CHAT_READ_TIMEOUT, connect=CHAT_CONNECT_TIMEOUT),
+        limits=httpx.Limits(max_connections=CHAT_POOL_CONNECTIONS, max_keepalive_connections=CHAT_POOL_CONNECTIONS,
+                            keepalive_expiry=CHAT_KEEPALIVE_EXPIRY),
+    )
+    return OpenAI(api_key=api_key, base_url=base_url, http_client=http_client, max_retries=CHAT_MAX_RETRIES)
+# ---- END CHAT CLIENT ----
+
+# ---- CHAT RESPONSE CACHE ----
+CHAT_CACHE_PATH = os.environ.get("DEEPSEEK_CACHE_PATH", response_cache.CACHE_PATH)
+CHAT_CACHE_TTL = float(os.environ.get("DEEPSEEK_CACHE_TTL", response_cache.DEFAULT_TTL))  # Seconds
+CHAT_CACHE_MAX_ENTRIES = int(os.environ.get("DEEPSEEK_CACHE_MAX_ENTRIES", response_cache.DEFAULT_MAX_ENTRIES))
+# ---- END CHAT RESPONSE CACHE ----
+
+# ---- CHAT GENERATION ----
+CHAT_MAX_CONCURRENT = int(os.environ.get("DEEPSEEK_MAX_CONCURRENT", 8))  # Answers generated at once per process
+
+
+@st.cache_resource(show_spinner=False)
+def generation_slots():
+    return threading.BoundedSemaphore(CHAT_MAX_CONCURRENT)
+
+
+@st.fragment(run_every=1.0 / STREAM_UPDATES_PER_SECOND)
+def show_generation():
+    # Redraws only this fragment while the session's answer is generated in the background, so the rest of
+    # the page (and every other tab) stays responsive. A finished or stopped answer joins the conversation.
+    generation = st.session_state.get("chat_generation")
+    if generation is None:
+        return
+    if generation.done:
+        del st.session_state.chat_generation
+        text = generation.text()
+        if generation.error is not None:
+            st.session_state.chat_notice = f"调用 DeepSeek API 时出错: {generation.error}"
+        if text and (generation.error is None or generation.cancelled):
+            st.session_state.messages.append({"role": "assistant", "content": text})
+        elif st.session_state.messages[-1]["role"] == "user":
+            st.session_state.messages.pop()
+        st.rerun()
+    with st.chat_message("assistant"):
+        st.markdown(generation.text() + STREAM_CURSOR)
+        if st.button("停止生成", key="stop_generation", disabled=generation.cancelled):
+            generation.cancel()
+# ---- END CHAT GENERATION ----
+
+# ---- CHAT HISTORY ----
+HISTORY_TOKEN_BUDGET = int(os.environ.get("DEEPSEEK_HISTORY_TOKENS", 6000))  # Estimated prompt tokens per request
+# ---- END CHAT HISTORY ----
+
+# ---- CHAT RETRIEVAL ----
+RETRIEVAL_TOP_K = 5
+RETRIEVAL_MIN_SCORE = 0.1  # Cosine similarity; small talk matches nothing and adds no context
+
+
+@st.cache_resource(show_spinner="正在加载数据库检索索引...", max_entries=4)
+def _cached_retrieval_index(path, mtime_ns, size):
+    # Loaded (or incrementally rebuilt and saved next to the workbook) once per workbook version.
+    import retrieval_index
+
+    return retrieval_index.load_index(path, _cached_workbook(path, mtime_ns, size))
+
+
+def retrieval_context(prompt, path=WORKBOOK_PATH):
+    # A system message with the workbook rows and columns closest to `prompt`, or None when nothing matches.
+    try:
+        hits = data_store.versioned(_cached_retrieval_index, path).search(prompt, RETRIEVAL_TOP_K, RETRIEVAL_MIN_SCORE)
+    except Exception as e:
+        print(f"Retrieval failed, answering without database context: {e}")  # For logs
+        return None
+    if not hits:
+        return None
+    records = "\n".join(document for _, document in hits)
+    return {"role": "system", "content": f"以下是压缩机数据库中与用户问题最相关的记录，回答时可以引用：\n{records}"}
+# ---- END CHAT RETRIEVAL ----
+
+# ---- SIMILAR DESIGNS ----
+DESIGN_KEY_COL = '论文编号'  # Rows of one paper with equal structural parameters are one design
+DESIGN_PERFORMANCE_COLS = (EFFICIENCY_COL, PRESSURE_RATIO_COL, FLOW_COL, SPEED_COL)
+DESIGN_DEFAULT_PARAMETERS = ('Tip clearance', 'Outlet diameter of impeller', 'Hub diameter', 'Width of impeller',
+                             'Blade thickness')
+DESIGN_MIN_VALUES = 50  # Sparser columns leave too few complete designs to compare
+DESIGN_MAX_RESULTS = 20
+
+
+def column_label(name):
+    alias = data_store.COLUMN_LABELS_ZH.get(name)
+    return f"{alias}（{name}）" if alias else f"{name}"
+
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def _structural_columns(path, mtime_ns, size):
+    workbook = _cached_workbook(path, mtime_ns, size)
+    excluded = set(DESIGN_PERFORMANCE_COLS) | {DESIGN_KEY_COL}
+    return [col for col in workbook.columns if col not in excluded
+            and pd.to_numeric(workbook[col], errors='coerce').notna().sum() >= DESIGN_MIN_VALUES]
+
+
+def structural_columns(path=WORKBOOK_PATH):
+    # Numeric workbook columns with at least DESIGN_MIN_VALUES values, other than the performance metrics.
+    return data_store.versioned(_structural_columns, path)
+
+
+@st.cache_resource(show_spinner="正在建立相似设计索引...", max_entries=16)
+def _cached_design_index(path, mtime_ns, size, parameters):
+    import design_search
+
+    return design_search.build_index(_cached_workbook(path, mtime_ns, size), list(parameters),
+                                     list(DESIGN_PERFORMANCE_COLS), DESIGN_KEY_COL)
+
+
+def design_index(parameters, path=WORKBOOK_PATH):
+    # Standardized KD-tree over the designs that have all `parameters`, built once per workbook version
+    # and parameter set.
+    return data_store.versioned(_cached_design_index, path, tuple(parameters))
+# ---- END SIMILAR DESIGNS ----
+
+# ---- SURROGATE MODEL ----
+SURROGATE_GRID_POINTS = 80
+SURROGATE_POLL_SECONDS = 2
+
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def _workbook_hash(path, mtime_ns, size):
+    return data_store.file_sha256(path)
+
+
+@st.cache_resource(show_spinner=False)
+def _training_pool():
+    # One spawned worker process per server: training never runs in, or forks, the server process.
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    return ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"))
+
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def _training_job(path, source_hash):
+    # Submitted at most once per workbook version and process; every session polls the same future.
+    import surrogate_model
+
+    return _training_pool().submit(surrogate_model.train, path, source_hash)
+
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def _cached_surrogate(path, source_hash):
+    import surrogate_model
+
+    return surrogate_model.load(path, source_hash)
+
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def _surrogate_surface(path, source_hash, grid_points):
+    return _cached_surrogate(path, source_hash).predict_grid(grid_points)
+
+
+def efficiency_surrogate(path=WORKBOOK_PATH, retry_failed=True):
+    # (model, workbook hash); the model is None while it is trained in the background, which the first
+    # call for a workbook version starts. A failed training is re-raised; with retry_failed the failed job
+    # is also dropped, so the next page run submits a new one.
+    import surrogate_model
+
+    source_hash = data_store.versioned(_workbook_hash, path)
+    if not os.path.exists(surrogate_model.model_path(path, source_hash)):
+        job = _training_job(path, source_hash)
+        if not job.done():
+            return None, source_hash
+        if retry_failed and job.exception() is not None:
+            _training_job.clear(path, source_hash)
+        job.result()
+    return _cached_surrogate(path, source_hash), source_hash
+
+
+@st.fragment(run_every=SURROGATE_POLL_SECONDS)
+def _await_surrogate(path):
+    # Polls without rerunning the page; once the model is saved the whole page reruns to draw the map.
+    try:
+        surrogate, _ = efficiency_surrogate(path, retry_failed=False)
+    except Exception:
+        surrogate = True  # Let the full rerun report the failure (and drop the job)
+    if surrogate is not None:
+        st.rerun()
+    st.info("等熵效率代理模型正在后台训练，完成后将在此显示预测的效率图。")
+
+
+def show_efficiency_map(measured_x, measured_y, path=WORKBOOK_PATH):
+    # Predicted efficiency over (speed, flow) as a continuous map, with the measured points on top.
+    import plotly.graph_objects as go
+
+    try:
+        surrogate, source_hash = efficiency_surrogate(path)
+    except Exception as e:
+        st.warning(f"等熵效率代理模型训练失败: {e}")
+        return
+    if surrogate is None:
+        _await_surrogate(path)
+        return
+    xi, yi, zi = _surrogate_surface(path, source_hash, SURROGATE_GRID_POINTS)
+    fig = go.Figure(go.Contour(
+        x=xi, y=yi, z=zi, colorscale='Viridis', contours_coloring='heatmap', line_width=0,
+        colorbar=dict(title="等熵效率"), hovertemplate="转速 %{x:.0f}<br>流量 %{y:.1f}<br>效率 %{z:.3f}<extra></extra>"
+    ))
+    fig.add_trace(go.Scatter(x=measured_x, y=measured_y, mode='markers', hoverinfo='skip', showlegend=False,
+                             marker=dict(size=3, color='white', opacity=0.4)))
+    fig.update_layout(
+        xaxis=dict(title="转速r/min", color="white"), yaxis=dict(title="质量流量g/s", color="white"),
+        height=400, margin=dict(l=0, r=0, b=0, t=0),
+        template="plotly_dark", plot_bgcolor='#08103f', paper_bgcolor='#08103f'
+    )
+    st.plotly_chart(fig, use_container_width=True, height=400)
+    score = f"，交叉验证 R²={surrogate.cv_r2:.2f}" if surrogate.cv_r2 is not None else ""
+    st.caption(f"高斯过程代理模型预测（{surrogate.n_samples} 个工况点{score}）；实测点范围之外不外推。")
+# ---- END SURROGATE MODEL ----
+
+bound_pyplot_figures()
+
 # Add global CSS for background color
 st.markdown(
     """
@@ -85,6 +736,11 @@ html_code = """
         .title {font-size: 32px; text-align: left;margin-top:-50px;margin-left: -350px;margin-bottom: 10px;padding: 0;color: white;}
         .canvas{position: relative; width:100%; min-height: 0vh; z-index: auto;}
         .stTabs {width:1400px; margin-left; margin-top:-40px;margin-left: -350px;color: white;}
+        .st-key-active_tab {width:1400px; margin-top:-40px;margin-left: -350px;border-bottom: 1px solid rgba(255, 255, 255, 0.2);}
+        .st-key-active_tab [role="radiogroup"] {gap: 2rem;}
+        .st-key-active_tab label {padding: 0.5rem 0; margin: 0; border-bottom: 2px solid transparent; cursor: pointer;}
+        .st-key-active_tab label > div:first-child {display: none;}
+        .st-key-active_tab label:has(input:checked) {border-bottom-color: #ff4b4b;}
         .stExpander {width: 1000px; margin: auto; color: white;}
     </style>
 </head>
@@ -100,10 +756,22 @@ html_code = """
 
 st.markdown(html_code, unsafe_allow_html=True)
 
-# Create tabs
-tabs = st.tabs(["首页", "数据分析", "趋势分析", "AI对话", "操作示例"])
+# Navigation styled like st.tabs. Unlike st.tabs, only the active section's body runs on a rerun.
+TAB_NAMES = ["首页", "数据分析", "设计检索", "趋势分析", "AI对话", "操作示例"]
+active_tab = st.radio("页面导航", TAB_NAMES, horizontal=True, label_visibility="collapsed", key="active_tab")
+
+
+def _remember_upload():
+    # Widget state is dropped while its section is not rendered, so keep the upload across page switches.
+    st.session_state.analysis_upload = st.session_state.data_analysis_uploader
+
+
+if active_tab == TAB_NAMES[0]:
+    import plotly.graph_objects as go
+    from bokeh.plotting import figure
+    from bokeh.sampledata.penguins import data as bokeh_penguins_data
+    from bokeh.transform import factor_cmap, factor_mark
 
-with tabs[0]:
     left, middle, right = st.columns([2.5, 5, 2.5])
 
     with left:
@@ -174,11 +842,10 @@ with tabs[0]:
                     """,
                     unsafe_allow_html=True
                 )
-                x1, x2, x3, x4 = np.random.randn(200) - 2, np.random.randn(200), np.random.randn(200) + 2, np.random.randn(200) + 4
-                hist_data = [x1, x2, x3, x4]
-                group_labels = ['Group 1', 'Group 2', 'Group 3', 'Group 4']
-                colors = ['#70C7F3', '#00F5FF', '#C724F1', '#00FFA3']
-                fig1 = ff.create_distplot(hist_data, group_labels, colors=colors, bin_size=0.2)
+                distributions = workbook_distributions()
+                group_labels = [label for label, _ in distributions]
+                colors = ['#70C7F3', '#00F5FF', '#C724F1', '#00FFA3'][:len(distributions)]
+                fig1 = distplot_figure([summary for _, summary in distributions], group_labels, colors)
                 fig1.update_layout(
                     height=230, margin=dict(l=20, r=20, t=0, b=20),
                     plot_bgcolor='#08103f', paper_bgcolor='#08103f',
@@ -215,31 +882,30 @@ with tabs[0]:
                     """,
                     unsafe_allow_html=True
                 )
-                df011 = pd.read_excel('./data1/data1.xlsx', usecols=[61], header=None, skiprows=137, nrows=53)
-                df012 = pd.read_excel('./data1/data1.xlsx', usecols=[61], header=None, skiprows=437, nrows=17)
-                df013 = pd.read_excel('./data1/data1.xlsx', usecols=[61], header=None, skiprows=521, nrows=50)
-                df021 = pd.read_excel('./data1/data1.xlsx', usecols=[60], header=None, skiprows=137, nrows=53)
-                df022 = pd.read_excel('./data1/data1.xlsx', usecols=[60], header=None, skiprows=437, nrows=17)
-                df023 = pd.read_excel('./data1/data1.xlsx', usecols=[60], header=None, skiprows=521, nrows=50)
-                df031 = pd.read_excel('./data1/data1.xlsx', usecols=[70], header=None, skiprows=137, nrows=53)
-                df032 = pd.read_excel('./data1/data1.xlsx', usecols=[70], header=None, skiprows=437, nrows=17)
-                df033 = pd.read_excel('./data1/data1.xlsx', usecols=[70], header=None, skiprows=521, nrows=50)
-                df01 = pd.concat([df011, df012, df013], ignore_index=True).squeeze()
-                df02 = pd.concat([df021, df022, df023], ignore_index=True).squeeze()
-                df03 = pd.concat([df031, df032, df033], ignore_index=True).squeeze()
-                fig = go.Figure(data=[go.Scatter3d(
-                    x=df01, y=df02, z=df03, mode='markers',
-                    marker=dict(size=12, color=df03, colorscale='Viridis', opacity=0.8)
-                )])
-                fig.update_layout(
-                    scene=dict(zaxis=dict(showbackground=False, title="等熵效率", color="white"),
-                               xaxis=dict(title="转速r/min", color="white"),
-                               yaxis=dict(title="质量流量g/s", color="white"),
-                               aspectmode="manual", aspectratio=dict(x=2, y=1, z=0.5)),
-                    width=500, height=450, margin=dict(l=0, r=0, b=0, t=0),
-                    template="plotly_dark", plot_bgcolor='#08103f', paper_bgcolor='#08103f'
-                )
-                st.plotly_chart(fig, use_container_width=True, height=450)
+                workbook = load_workbook()
+                df01 = overview_series(workbook, SPEED_COL)
+                df02 = overview_series(workbook, FLOW_COL)
+                df03 = overview_series(workbook, EFFICIENCY_COL)
+                overview = level_of_detail(pd.DataFrame({"x": df01, "y": df02, "z": df03}), ["x", "y", "z"],
+                                           SCATTER3D_POINT_BUDGET, key="overview_zoom", zoom_label="转速范围")
+                # The tile already sits in a column, so the two views share it as tabs
+                scatter_tab, map_tab = st.tabs(["实测工况点", "效率预测图"])
+                with scatter_tab:
+                    fig = go.Figure(data=[go.Scatter3d(
+                        x=overview["x"], y=overview["y"], z=overview["z"], mode='markers',
+                        marker=dict(size=12, color=overview["z"], colorscale='Viridis', opacity=0.8)
+                    )])
+                    fig.update_layout(
+                        scene=dict(zaxis=dict(showbackground=False, title="等熵效率", color="white"),
+                                   xaxis=dict(title="转速r/min", color="white"),
+                                   yaxis=dict(title="质量流量g/s", color="white"),
+                                   aspectmode="manual", aspectratio=dict(x=2, y=1, z=0.5)),
+                        width=500, height=400, margin=dict(l=0, r=0, b=0, t=0),
+                        template="plotly_dark", plot_bgcolor='#08103f', paper_bgcolor='#08103f'
+                    )
+                    st.plotly_chart(fig, use_container_width=True, height=400)
+                with map_tab:
+                    show_efficiency_map(overview["x"], overview["y"])
 
     with right:
         row1 = st.columns(1)
@@ -274,7 +940,7 @@ with tabs[0]:
                 MARKERS = ['hex', 'circle_x', 'triangle']
                 p_bokeh = figure(
                     title="", tools="hover,reset", background_fill_color=None, border_fill_color=None,
-                    height=200, width=300, sizing_mode="scale_width"
+                    height=200, width=300, sizing_mode="scale_width", output_backend="webgl"
                 )
                 p_bokeh.scatter("flipper_length_mm", "body_mass_g", source=bokeh_penguins_data, size=5, fill_alpha=0.2, line_alpha=0, color=factor_cmap('species', 'Category10_3', SPECIES))
                 p_bokeh.scatter("flipper_length_mm", "body_mass_g", source=bokeh_penguins_data, fill_alpha=0.6, size=5, line_width=0.5, line_color="black", marker=factor_mark('species', MARKERS, SPECIES), color=factor_cmap('species', 'Category10_3', SPECIES))
@@ -320,14 +986,10 @@ with tabs[0]:
                 """,
                 unsafe_allow_html=True
             )
-            excel_file_path = './data1/data1.xlsx'
             df_db_types = pd.DataFrame(columns=["论文类型", "数据类型"])
             data_load_success = False
             try:
-                actual_cols_to_read = ["论文类型", "Unnamed: 2"]
-                df_temp = pd.read_excel(excel_file_path, usecols=actual_cols_to_read)
-                df_temp.rename(columns={"Unnamed: 2": "数据类型"}, inplace=True)
-                df_db_types = df_temp
+                df_db_types = load_workbook()[["论文类型", "数据类型"]]
                 data_load_success = True
             except Exception as e:
                 st.error(f"Error loading data for pie charts: {e}")
@@ -344,13 +1006,6 @@ with tabs[0]:
                     data_type_labels_all = data_type_counts.index.tolist()
                     data_type_values_all = data_type_counts.values.tolist()
 
-            simhei_font_prop = None
-            if os.path.exists(font_path):
-                try:
-                    simhei_font_prop = fm.FontProperties(fname=font_path)
-                except Exception as e:
-                    st.warning(f"Could not load FontProperties for SimHei: {e}")
-
             if data_load_success:
                 pie_col1, pie_col2 = st.columns(2)
                 chart_font_color = 'white'
@@ -358,115 +1013,19 @@ with tabs[0]:
 
                 with pie_col1:
                     if paper_labels_all and paper_values_all:
-                        fig_paper, ax_paper = plt.subplots(figsize=(2.8, 2.8))
-                        fig_paper.patch.set_alpha(0.0)
-                        ax_paper.patch.set_alpha(0.0)
-                        sorted_paper_data = sorted(zip(paper_values_all, paper_labels_all), reverse=True)
-                        sorted_paper_values = [data[0] for data in sorted_paper_data]
-                        sorted_paper_labels = [data[1] for data in sorted_paper_data]
-                        paper_colors = sns.color_palette("Blues_r", len(sorted_paper_labels))
-
-                        pie_textprops = {'fontsize': 10, 'color': 'white'}
-                        if simhei_font_prop:
-                            pie_textprops['fontproperties'] = simhei_font_prop
-
-                        wedges, texts, autotexts = ax_paper.pie(
-                            sorted_paper_values,
-                            autopct='%1.1f%%',
-                            startangle=90,
-                            colors=paper_colors,
-                            pctdistance=0.85,
-                            textprops=pie_textprops,
-                            wedgeprops=dict(width=0.4, edgecolor=donut_hole_color)
-                        )
-                        for autotext_item in autotexts:
-                            autotext_item.set_color('black' if sum(paper_colors[autotexts.index(autotext_item)][:3]) / 3 > 0.6 else 'white')
-                            if simhei_font_prop:
-                                autotext_item.set_fontproperties(simhei_font_prop)
-
-                        if sorted_paper_labels:
-                            center_label_paper = sorted_paper_labels[0]
-                            center_value_paper = (sorted_paper_values[0] / sum(sorted_paper_values)) * 100 if sum(sorted_paper_values) > 0 else 0
-                            text_args_center = {'ha': 'center', 'va': 'center', 'color': chart_font_color, 'weight': 'bold'}
-                            if simhei_font_prop:
-                                text_args_center['fontproperties'] = simhei_font_prop
-                            ax_paper.text(0, 0.1, f"{center_label_paper}", fontsize=12, **text_args_center)
-                            ax_paper.text(0, -0.15, f"{center_value_paper:.1f}%", fontsize=14, **text_args_center)
-
-                        ax_paper.axis('equal')
-                        if len(sorted_paper_labels) > 1:
-                            legend_labels_list = [f"{sorted_paper_labels[i]}" for i in range(1, min(len(sorted_paper_labels), 4))]
-                            legend_wedges_list = wedges[1:min(len(wedges), 4)]
-                            if legend_labels_list:
-                                legend_font_properties = None
-                                if simhei_font_prop:
-                                    legend_font_properties = fm.FontProperties(fname=font_path, size=10)
-                                else:
-                                    legend_font_properties = {'size': 10}
-                                ax_paper.legend(legend_wedges_list, legend_labels_list,
-                                                loc="lower center", bbox_to_anchor=(0.5, -0.25),
-                                                labelcolor=chart_font_color, facecolor='none', edgecolor='none', ncol=2,
-                                                prop=legend_font_properties)
-                        st.pyplot(fig_paper, use_container_width=True)
+                        st.image(donut_png(tuple(zip(paper_labels_all, paper_values_all)), "Blues_r",
+                                           chart_font_color, donut_hole_color), use_container_width=True)
                     else:
                         st.markdown("<p style='color:white; text-align:center; font-size:12px; margin-top: 50px;'>No paper type data</p>", unsafe_allow_html=True)
 
                 with pie_col2:
                     if data_type_labels_all and data_type_values_all:
-                        fig_data, ax_data = plt.subplots(figsize=(2.8, 2.8))
-                        fig_data.patch.set_alpha(0.0)
-                        ax_data.patch.set_alpha(0.0)
-                        sorted_data_type_data = sorted(zip(data_type_values_all, data_type_labels_all), reverse=True)
-                        sorted_data_type_values = [data[0] for data in sorted_data_type_data]
-                        sorted_data_type_labels = [data[1] for data in sorted_data_type_data]
-                        data_type_colors = sns.color_palette("Greens_r", len(sorted_data_type_labels))
-
-                        pie_textprops_data = {'fontsize': 10, 'color': 'white'}
-                        if simhei_font_prop:
-                            pie_textprops_data['fontproperties'] = simhei_font_prop
-
-                        wedges_data, texts_data, autotexts_data = ax_data.pie(
-                            sorted_data_type_values,
-                            autopct='%1.1f%%',
-                            startangle=90,
-                            colors=data_type_colors,
-                            pctdistance=0.85,
-                            textprops=pie_textprops_data,
-                            wedgeprops=dict(width=0.4, edgecolor=donut_hole_color)
-                        )
-                        for autotext_item in autotexts_data:
-                            autotext_item.set_color('black' if sum(data_type_colors[autotexts_data.index(autotext_item)][:3]) / 3 > 0.6 else 'white')
-                            if simhei_font_prop:
-                                autotext_item.set_fontproperties(simhei_font_prop)
-
-                        if sorted_data_type_labels:
-                            center_label_data = sorted_data_type_labels[0]
-                            center_value_data = (sorted_data_type_values[0] / sum(sorted_data_type_values)) * 100 if sum(sorted_data_type_values) > 0 else 0
-                            text_args_center_data = {'ha': 'center', 'va': 'center', 'color': chart_font_color, 'weight': 'bold'}
-                            if simhei_font_prop:
-                                text_args_center_data['fontproperties'] = simhei_font_prop
-                            ax_data.text(0, 0.1, f"{center_label_data}", fontsize=12, **text_args_center_data)
-                            ax_data.text(0, -0.15, f"{center_value_data:.1f}%", fontsize=14, **text_args_center_data)
-
-                        ax_data.axis('equal')
-                        if len(sorted_data_type_labels) > 1:
-                            legend_labels_list_2 = [f"{sorted_data_type_labels[i]}" for i in range(1, min(len(sorted_data_type_labels), 4))]
-                            legend_wedges_list_2 = wedges_data[1:min(len(wedges_data), 4)]
-                            if legend_labels_list_2:
-                                legend_font_properties_data = None
-                                if simhei_font_prop:
-                                    legend_font_properties_data = fm.FontProperties(fname=font_path, size=10)
-                                else:
-                                    legend_font_properties_data = {'size': 10}
-                                ax_data.legend(legend_wedges_list_2, legend_labels_list_2,
-                                               loc="lower center", bbox_to_anchor=(0.5, -0.25),
-                                               labelcolor=chart_font_color, facecolor='none', edgecolor='none', ncol=2,
-                                               prop=legend_font_properties_data)
-                        st.pyplot(fig_data, use_container_width=True)
+                        st.image(donut_png(tuple(zip(data_type_labels_all, data_type_values_all)), "Greens_r",
+                                           chart_font_color, donut_hole_color), use_container_width=True)
                     else:
                         st.markdown("<p style='color:white; text-align:center; font-size:12px; margin-top: 50px;'>No data type data</p>", unsafe_allow_html=True)
 
-with tabs[1]:
+if active_tab == TAB_NAMES[1]:
     left1, middle2, middle1 = st.columns([0.3, 0.1, 0.7])
 
     with left1:
@@ -493,13 +1052,14 @@ with tabs[1]:
             """,
             unsafe_allow_html=True
         )
-        uploaded_file = st.file_uploader("上传CSV或Excel文件进行分析", type=["csv", "xlsx"], key="data_analysis_uploader")
+        uploaded_file = st.file_uploader("上传CSV或Excel文件进行分析", type=["csv", "xlsx"], key="data_analysis_uploader",
+                                         on_change=_remember_upload)
+        uploaded_file = uploaded_file or st.session_state.get("analysis_upload")
+        dataset = None
         df = None
         if uploaded_file is not None:
-            if uploaded_file.name.endswith('.csv'):
-                df = pd.read_csv(uploaded_file, header=2)
-            elif uploaded_file.name.endswith('.xlsx'):
-                df = pd.read_excel(uploaded_file, header=2, engine='openpyxl')
+            dataset = load_upload(uploaded_file)
+            df = dataset.frame if dataset is not None else None
             st.write("上传的文件数据：")
             st.dataframe(df)
 
@@ -536,6 +1096,10 @@ with tabs[1]:
                     key="chart_type_selector"
                 )
                 if option == "散点图1":
+                    from bokeh.models import ColumnDataSource
+                    from bokeh.plotting import figure
+                    from bokeh.transform import factor_cmap, factor_mark
+
                     all_columns = df.columns.tolist()
                     title1_col, titlex_col = st.columns(2)
                     with title1_col:
@@ -551,50 +1115,46 @@ with tabs[1]:
                     with titley_col:
                         titley = st.text_input("请输入y轴的列名", value=title2, key="s1_y_label")
 
-                    st.write("请选择Y轴的4个数据范围进行对比：")
-                    range_col1, range_col2 = st.columns(2)
-                    with range_col1:
-                        values2 = st.slider("选择第一个y的表格范围", 0, len(df)-1 if df is not None else 2000, (0, min(25, len(df)-1 if df is not None else 25)) if df is not None else (25,75), key="s1_range1")
-                        values3 = st.slider("选择第二个y的表格范围", 0, len(df)-1 if df is not None else 2000, (min(26, len(df)-1 if df is not None else 26), min(50, len(df)-1 if df is not None else 50)) if df is not None else (25,75), key="s1_range2")
-                    with range_col2:
-                        values4 = st.slider("选择第三个y的表格范围", 0, len(df)-1 if df is not None else 2000, (min(51, len(df)-1 if df is not None else 51), min(75, len(df)-1 if df is not None else 75)) if df is not None else (25,75), key="s1_range3")
-                        values5 = st.slider("选择第四个y的表格范围", 0, len(df)-1 if df is not None else 2000, (min(76, len(df)-1 if df is not None else 76), min(100, len(df)-1 if df is not None else 100)) if df is not None else (25,75), key="s1_range4")
-
-                    titlex1_val = st.text_input("请输入图表名称", f"{titley} 四范围对比", key="s1_chart_title")
-                    species_input = st.text_input("输入品种名称（用逗号分隔4个名称）",
-                                                "范围1,范围2,范围3,范围4", key="s1_species_names")
+                    range_count = st.number_input("对比范围数量", min_value=1, max_value=len(RANGE_MARKERS), value=4, step=1, key="s1_range_count")
+                    st.write(f"请选择Y轴的{range_count}个数据范围进行对比：")
+                    max_row = len(df) - 1
+                    ranges = []
+                    range_columns = st.columns(2)
+                    for i in range(range_count):
+                        with range_columns[i * 2 // range_count]:
+                            default_range = (min(0 if i == 0 else 25 * i + 1, max_row), min(25 * (i + 1), max_row))
+                            ranges.append(st.slider(f"选择第{CHINESE_NUMERALS[i]}个y的表格范围", 0, max_row, default_range, key=f"s1_range{i+1}"))
+
+                    titlex1_val = st.text_input("请输入图表名称", f"{titley} {CHINESE_NUMERALS[range_count - 1]}范围对比", key="s1_chart_title")
+                    species_input = st.text_input(f"输入品种名称（用逗号分隔{range_count}个名称）",
+                                                ",".join(f"范围{i+1}" for i in range(range_count)), key="s1_species_names")
                     species_list_raw = [s.strip() for s in species_input.split(",") if s.strip()]
-                    species_list = (species_list_raw + [f"范围{i+1}" for i in range(len(species_list_raw), 4)])[:4]
-
-                    ranges = [values2, values3, values4, values5]
-                    data_combined = pd.DataFrame()
+                    species_list = (species_list_raw + [f"范围{i+1}" for i in range(len(species_list_raw), range_count)])[:range_count]
 
                     try:
-                        df[title1] = pd.to_numeric(df[title1], errors='coerce')
-                        df[title2] = pd.to_numeric(df[title2], errors='coerce')
-                        df_plot = df.dropna(subset=[title1, title2])
+                        df_plot = dataset.numeric([title1, title2])[dataset.valid_rows([title1, title2])]
                         if df_plot.empty:
                             st.warning(f"选择的列 '{title1}' 或 '{title2}' 经过数值转换后没有有效数据。")
                         else:
                             for i, (start, end) in enumerate(ranges):
-                                if start <= end and start < len(df_plot) and end < len(df_plot):
-                                    section = df_plot.iloc[start:end + 1].copy()
-                                    section["group"] = species_list[i]
-                                    data_combined = pd.concat([data_combined, section])
-                                else:
+                                if not (start <= end and start < len(df_plot) and end < len(df_plot)):
                                     st.warning(f"范围 {i+1} ({start}-{end}) 无效或超出数据界限。跳过此范围.")
+                            data_combined = chart_kernels.stack_row_ranges(df_plot, [title1, title2], ranges, species_list)
 
                             if not data_combined.empty:
+                                data_combined = level_of_detail(data_combined, [title1, title2], BOKEH_POINT_BUDGET,
+                                                                key="s1_zoom", zoom_label=f"{titlex} 范围")
                                 SPECIES_plot = sorted(data_combined["group"].unique())
-                                MARKERS_plot = ['hex', 'circle_x', 'triangle', 'square']
                                 num_groups = len(SPECIES_plot)
-                                current_markers = MARKERS_plot[:num_groups]
+                                current_markers = list(RANGE_MARKERS[:num_groups])
                                 current_colors_palette = 'Category10_' + str(max(3, num_groups))
 
-                                p_bokeh_s1 = figure(title=titlex1_val, background_fill_color="#fafafa")
+                                p_bokeh_s1 = figure(title=titlex1_val, background_fill_color="#fafafa", output_backend="webgl")
                                 p_bokeh_s1.xaxis.axis_label = titlex
                                 p_bokeh_s1.yaxis.axis_label = titley
-                                p_bokeh_s1.scatter(title1, title2, source=data_combined,
+                                # Built from the columns directly so the pandas index is not shipped as an extra column.
+                                source_s1 = ColumnDataSource(data={col: data_combined[col].to_numpy() for col in data_combined.columns})
+                                p_bokeh_s1.scatter(title1, title2, source=source_s1,
                                         legend_group="group",
                                         fill_alpha=0.4, size=12,
                                         marker=factor_mark('group', current_markers, SPECIES_plot),
@@ -652,29 +1212,44 @@ with tabs[1]:
                     if len(selected_columns_corr) < 2:
                         st.warning("请至少选择两列进行相关性分析。")
                     else:
-                        df_numeric_corr = df[selected_columns_corr].copy()
-                        for col in selected_columns_corr:
-                            df_numeric_corr[col] = pd.to_numeric(df_numeric_corr[col], errors='coerce')
-                        df_clean_corr = df_numeric_corr.dropna()
-                        final_numeric_cols = df_clean_corr.columns[df_clean_corr.dtypes.apply(lambda x: pd.api.types.is_numeric_dtype(x))].tolist()
+                        matrices_corr = correlation_matrices(dataset)
+                        final_numeric_cols = [c for c in dict.fromkeys(selected_columns_corr) if c in matrices_corr.counts.columns]
 
                         if len(final_numeric_cols) < 2:
                             st.warning(f"选择的列中，数值型数据不足两列进行相关性分析。可用的数值列: {final_numeric_cols}")
                         else:
-                            df_for_corr = df_clean_corr[final_numeric_cols]
                             genre_corr = st.radio("请选择相关性分析方法", ["Pearson", "Spearman"], index=0, key="corr_method")
                             st.write("您选择了:", genre_corr)
-                            method_corr = 'pearson' if genre_corr == "Pearson" else 'spearman'
-                            corr_matrix = df_for_corr.corr(method=method_corr)
-                            st.write(f'{genre_corr} 相关系数矩阵为：')
+                            full_corr = matrices_corr.pearson if genre_corr == "Pearson" else matrices_corr.spearman
+                            corr_matrix = full_corr.loc[final_numeric_cols, final_numeric_cols]
+                            st.write(f'{genre_corr} 相关系数矩阵为（按列对的有效样本计算）：')
                             st.dataframe(corr_matrix)
-                            fig_corr, ax_corr = plt.subplots(figsize=(max(8, len(final_numeric_cols)), max(6, len(final_numeric_cols))))
-                            im_corr, cbar_corr = heatmap(corr_matrix.values, final_numeric_cols, final_numeric_cols, ax=ax_corr,
-                                                    cmap="YlGn", cbarlabel=f"{genre_corr} Correlation")
-                            texts_corr = annotate_heatmap(im_corr, valfmt="{x:.3f}")
-                            fig_corr.tight_layout()
-                            st.pyplot(fig_corr)
-                            plt.close(fig_corr)
+                            with st.expander("每对列的有效样本数"):
+                                st.dataframe(matrices_corr.counts.loc[final_numeric_cols, final_numeric_cols])
+                            if genre_corr == "Spearman" and not matrices_corr.spearman_exact:
+                                st.caption("数据量较大：缺失位置不同的列对使用整列秩近似计算 Spearman 相关系数。")
+                            order_col, top_k_col = st.columns(2)
+                            with order_col:
+                                order_corr = st.radio("热力图排序", ["原始顺序", "层次聚类"], index=0, horizontal=True, key="corr_order")
+                            with top_k_col:
+                                top_k_corr = st.number_input("仅显示相关性最强的前k列 (0为全部)", min_value=0, value=0, step=1, key="corr_top_k")
+                            plot_corr = top_k_correlation(corr_matrix, top_k_corr)
+                            if order_corr == "层次聚类":
+                                plot_corr = cluster_order_correlation(plot_corr)
+                            plot_cols_corr = plot_corr.columns.tolist()
+                            if plot_corr.size > HEATMAP_ANNOTATE_MAX_CELLS:
+                                st.plotly_chart(correlation_heatmap_figure(plot_corr, f"{genre_corr} Correlation"), use_container_width=True)
+                            else:
+                                import matplotlib.pyplot as plt
+                                import matplotlib.ticker
+                                setup_matplotlib()
+                                fig_corr, ax_corr = plt.subplots(figsize=(max(8, len(plot_cols_corr)), max(6, len(plot_cols_corr))))
+                                im_corr, cbar_corr = heatmap(plot_corr.values, plot_cols_corr, plot_cols_corr, ax=ax_corr,
+                                                        cmap="YlGn", cbarlabel=f"{genre_corr} Correlation")
+                                texts_corr = annotate_heatmap(im_corr, valfmt="{x:.3f}")
+                                fig_corr.tight_layout()
+                                st.pyplot(fig_corr)
+                                plt.close(fig_corr)
 
                 elif option == "直方图、kde 图和地毯图":
                     all_columns_hist = df.columns.tolist()
@@ -689,29 +1264,23 @@ with tabs[1]:
                             idx = default_indices[i] if default_indices[i] < len(all_columns_hist) else 0
                             selected_hist.append(st.selectbox(f"第{i+1}个参数", all_columns_hist, index=idx, key=f"hist_param_{i+1}"))
 
-                    hist_data_plotly = []
+                    hist_summaries = []
                     group_labels_plotly = []
                     for i, col_name in enumerate(selected_hist):
                         try:
-                            series = pd.to_numeric(df[col_name], errors='coerce').dropna()
-                            if not series.empty:
-                                if normalize_choice_hist == "是":
-                                    scaler = StandardScaler()
-                                    series_scaled = pd.Series(scaler.fit_transform(series.values.reshape(-1, 1)).flatten(), index=series.index)
-                                    hist_data_plotly.append(series_scaled.values)
-                                    group_labels_plotly.append(f"{col_name} (标准化)")
-                                else:
-                                    hist_data_plotly.append(series.values)
-                                    group_labels_plotly.append(col_name)
+                            summary_hist = column_density(dataset, col_name, normalize_choice_hist == "是", bin_size=.2)
+                            if summary_hist is not None:
+                                hist_summaries.append(summary_hist)
+                                group_labels_plotly.append(f"{col_name} (标准化)" if normalize_choice_hist == "是" else col_name)
                             else:
                                 st.warning(f"列 '{col_name}' 无有效数值数据，已跳过。")
                         except Exception as e:
                             st.error(f"处理列 '{col_name}' 时出错: {str(e)}")
 
-                    if hist_data_plotly:
-                        colors_plotly = ['#A4C8D7', '#8AB78E', '#C8AFDC', '#FFB466'][:len(hist_data_plotly)]
+                    if hist_summaries:
+                        colors_plotly = ['#A4C8D7', '#8AB78E', '#C8AFDC', '#FFB466'][:len(hist_summaries)]
                         try:
-                            fig_hist = ff.create_distplot(hist_data_plotly, group_labels_plotly, bin_size=.2, colors=colors_plotly)
+                            fig_hist = distplot_figure(hist_summaries, group_labels_plotly, colors_plotly)
                             for trace_hist in fig_hist.data:
                                 if 'marker' in trace_hist:
                                     trace_hist.update(opacity=1, marker=dict(line=dict(color='black', width=1)))
@@ -720,14 +1289,13 @@ with tabs[1]:
                                 title="直方图与KDE密度图",
                                 plot_bgcolor='white', paper_bgcolor='white',
                                 margin=dict(l=50, r=50, t=50, b=50),
-                                xaxis=dict(title_text="数值", tickfont=dict(size=12, family='SimHei' if simhei_font_prop else 'sans-serif', color='black'), linewidth=2, linecolor='black'),
-                                yaxis=dict(title_text="密度", tickfont=dict(size=12, family='SimHei' if simhei_font_prop else 'sans-serif', color='black'), linewidth=2, linecolor='black'),
-                                legend=dict(x=0.01, y=0.99, bgcolor='rgba(255, 255, 255, 0.7)', bordercolor='#ddd', borderwidth=1, font=dict(size=12, color='#333', family='SimHei' if simhei_font_prop else 'sans-serif'), itemsizing='constant')
+                                xaxis=dict(title_text="数值", tickfont=dict(size=12, family='SimHei' if simhei_available else 'sans-serif', color='black'), linewidth=2, linecolor='black'),
+                                yaxis=dict(title_text="密度", tickfont=dict(size=12, family='SimHei' if simhei_available else 'sans-serif', color='black'), linewidth=2, linecolor='black'),
+                                legend=dict(x=0.01, y=0.99, bgcolor='rgba(255, 255, 255, 0.7)', bordercolor='#ddd', borderwidth=1, font=dict(size=12, color='#333', family='SimHei' if simhei_available else 'sans-serif'), itemsizing='constant')
                             )
                             st.plotly_chart(fig_hist, use_container_width=True)
                         except Exception as e:
-                            st.error(f"创建 Plotly distplot 时出错: {e}. 可能的原因是数据列只有单一值或标准差为0。")
-                            st.write("用于绘图的数据:", hist_data_plotly)
+                            st.error(f"创建直方图与KDE密度图时出错: {e}")
                             st.write("分组标签:", group_labels_plotly)
                     else:
                         st.warning("没有可用于绘制直方图的数据.")
@@ -738,32 +1306,26 @@ with tabs[1]:
                     y_col_c = st.selectbox("请选择y变量", all_columns_contour, index=min(1, len(all_columns_contour)-1), key="contour_y")
                     z_col_c = st.selectbox("请选择z变量", all_columns_contour, index=min(2, len(all_columns_contour)-1), key="contour_z")
 
+                    grid_col_c, method_col_c = st.columns(2)
+                    with grid_col_c:
+                        grid_size_c = st.select_slider("插值网格分辨率", CONTOUR_GRID_SIZES, value=100, key="contour_grid")
+                    with method_col_c:
+                        method_label_c = st.radio("插值方法", list(CONTOUR_INTERPOLATORS), index=0, horizontal=True, key="contour_method")
+
                     try:
-                        df_clean_c = df[[x_col_c, y_col_c, z_col_c]].copy()
-                        df_clean_c[x_col_c] = pd.to_numeric(df_clean_c[x_col_c], errors='coerce')
-                        df_clean_c[y_col_c] = pd.to_numeric(df_clean_c[y_col_c], errors='coerce')
-                        df_clean_c[z_col_c] = pd.to_numeric(df_clean_c[z_col_c], errors='coerce')
-                        df_clean_c = df_clean_c.dropna()
+                        contour = contour_engine(dataset, x_col_c, y_col_c, z_col_c, grid_size_c, CONTOUR_INTERPOLATORS[method_label_c])
 
-                        if len(df_clean_c) < 3:
+                        if contour is None:
                             st.warning("进行三角剖分至少需要3个有效的数值数据点。请检查数据或选择其他列。")
                         else:
-                            x_c = df_clean_c[x_col_c].values
-                            y_c = df_clean_c[y_col_c].values
-                            z_c = df_clean_c[z_col_c].values
+                            triang_c, z_c, xi_c, yi_c, zi_c = contour
+                            x_c, y_c = triang_c.x, triang_c.y
 
+                            import matplotlib.pyplot as plt
+                            setup_matplotlib()
                             fig_c, (ax1_c, ax2_c) = plt.subplots(nrows=2, figsize=(10, 12))
                             fig_c.patch.set_facecolor('#08103f')
 
-                            ngridx, ngridy = 100, 100
-                            xi_c = np.linspace(x_c.min(), x_c.max(), ngridx)
-                            yi_c = np.linspace(y_c.min(), y_c.max(), ngridy)
-
-                            triang_c = tri.Triangulation(x_c, y_c)
-                            interpolator_c = tri.LinearTriInterpolator(triang_c, z_c)
-                            Xi_c, Yi_c = np.meshgrid(xi_c, yi_c)
-                            zi_c = interpolator_c(Xi_c, Yi_c)
-
                             for ax_current in [ax1_c, ax2_c]:
                                 ax_current.set_facecolor('#08103f')
                                 ax_current.tick_params(colors='white')
@@ -785,8 +1347,8 @@ with tabs[1]:
                             ax1_c.set_xlabel(x_col_c)
                             ax1_c.set_ylabel(y_col_c)
 
-                            line_contour2_c = ax2_c.tricontour(x_c, y_c, z_c, levels=14, linewidths=0.5, colors='white', alpha=0.7)
-                            cntr2_c = ax2_c.tricontourf(x_c, y_c, z_c, levels=14, cmap="viridis")
+                            line_contour2_c = ax2_c.tricontour(triang_c, z_c, levels=14, linewidths=0.5, colors='white', alpha=0.7)
+                            cntr2_c = ax2_c.tricontourf(triang_c, z_c, levels=14, cmap="viridis")
                             ax2_c.clabel(line_contour2_c, inline=True, fontsize=8, fmt='%.1f', colors='white')
 
                             cbar2 = fig_c.colorbar(cntr2_c, ax=ax2_c)
@@ -806,22 +1368,49 @@ with tabs[1]:
             else:
                 st.info("请先在左侧上传一个CSV或Excel文件以进行数据分析.")
 
-with tabs[2]:
-    st.markdown("### 趋势分析图示")
-    image_folder = "pic"
-    image_files = [f"{i}.png" for i in range(1, 30)]
-    for img_file in image_files:
-        try:
-            full_path = os.path.join(image_folder, img_file)
-            if os.path.exists(full_path):
-                image = Image.open(full_path)
-                st.image(image, width=1200, caption=f"趋势图: {img_file}")
+if active_tab == TAB_NAMES[2]:
+    st.markdown("### 相似设计检索")
+    st.caption("输入空压机结构参数，从数据库中检索结构最相近的设计及其性能指标（各参数先标准化，再按欧氏距离排序）。")
+    try:
+        candidates_design = structural_columns()
+        parameters_design = st.multiselect(
+            "结构参数", candidates_design, default=[c for c in DESIGN_DEFAULT_PARAMETERS if c in candidates_design],
+            format_func=column_label, key="design_parameters")
+        if not parameters_design:
+            st.info("请至少选择一个结构参数。")
+        else:
+            index_design = design_index(parameters_design)
+            if len(index_design) == 0:
+                st.warning("数据库中没有同时具备所选参数的设计，请减少结构参数。")
             else:
-                st.warning(f"图片文件 {full_path} 未找到。")
-        except Exception as e:
-            st.error(f"加载图片 {img_file} 时出错: {e}")
+                value_cols_design = st.columns(min(len(parameters_design), 4))
+                values_design = []
+                for i, col in enumerate(parameters_design):
+                    with value_cols_design[i % len(value_cols_design)]:
+                        values_design.append(st.number_input(column_label(col), value=float(index_design.designs[col].median()),
+                                                             format="%g", key=f"design_value_{col}"))
+                max_k_design = min(DESIGN_MAX_RESULTS, len(index_design))
+                k_design = st.number_input("返回设计数量", min_value=1, max_value=max_k_design, value=min(5, max_k_design),
+                                           step=1, key="design_k")
+
+                start_design = time.perf_counter()
+                positions_design, distances_design = index_design.nearest(values_design, k_design)
+                elapsed_design = time.perf_counter() - start_design
+
+                labels_design = {col: column_label(col) for col in parameters_design}
+                labels_design.update({f"{col} {stat}": f"{column_label(col)} {stat}"
+                                      for col in DESIGN_PERFORMANCE_COLS for stat in ("最小", "最大")})
+                result_design = index_design.designs.iloc[positions_design].assign(距离=distances_design)
+                st.dataframe(result_design.rename(columns=labels_design), hide_index=True, use_container_width=True)
+                st.caption(f"在 {len(index_design)} 个设计中检索用时 {elapsed_design * 1e3:.2f} 毫秒；距离以标准差为单位。")
+    except Exception as e:
+        st.error(f"相似设计检索时发生错误: {e}")
+
+if active_tab == TAB_NAMES[3]:
+    st.markdown("### 趋势分析图示")
+    show_gallery(image_cache.discover_sources(exclude=OPERATION_EXAMPLE_IMAGES), "趋势图", key="trend_gallery")
 
-with tabs[3]:
+if active_tab == TAB_NAMES[4]:
     st.title("💬 DeepSeek AI 对话")
     st.write(
         "这是一个简单的聊天机器人，它使用 DeepSeek 的模型来生成响应。 "
@@ -832,6 +1421,10 @@ with tabs[3]:
         st.session_state.api_key = os.environ.get("DEEPSEEK_API_KEY", None)
     if "messages" not in st.session_state:
         st.session_state.messages = [{"role": "system", "content": "你是一个乐于助人的AI助手."}]
+    if "history_start" not in st.session_state:
+        # messages[1:history_start] have been folded into history_summary and are no longer sent.
+        st.session_state.history_start = 1
+        st.session_state.history_summary = ""
 
     if not st.session_state.api_key:
         api_key_input = st.text_input("请输入DeepSeek API 密钥", type="password", key="deepseek_api_key_input")
@@ -843,53 +1436,80 @@ with tabs[3]:
             st.info("请输入您的DeepSeek API密钥以启用聊天功能.")
             st.stop()
     else:
+        cache_caption = st.empty()  # Filled after this turn's lookup, so the counters include it
+        if notice := st.session_state.pop("chat_notice", None):
+            st.error(notice)
         for message in st.session_state.messages:
             if message["role"] != "system":
                 with st.chat_message(message["role"]):
                     st.markdown(message["content"])
 
         try:
-            client = OpenAI(api_key=st.session_state.api_key, base_url="https://api.deepseek.com/v1")
-            if prompt := st.chat_input("请输入您的问题..."):
+            client = chat_client(st.session_state.api_key)
+        except Exception as e:
+            st.error(f"初始化 OpenAI 客户端时出错: {e}. 请检查您的 API 密钥和网络连接。")
+            st.session_state.api_key = None
+            st.rerun()  # Changed from st.experimental_rerun()
+
+        # Failures past this point (retrieval, cache, the generation fragment) are not the key's fault, so it is kept.
+        try:
+            generating = "chat_generation" in st.session_state
+            if (prompt := st.chat_input("请输入您的问题...", disabled=generating)) and not generating:
                 st.session_state.messages.append({"role": "user", "content": prompt})
                 with st.chat_message("user"):
                     st.markdown(prompt)
 
                 with st.chat_message("assistant"):
-                    message_placeholder = st.empty()
-                    full_response = ""
-                    try:
-                        stream = client.chat.completions.create(
-                            model="deepseek-chat",
-                            messages=[{"role": m["role"], "content": m["content"]} for m in st.session_state.messages],
-                            stream=True,
-                        )
-                        for chunk in stream:
-                            if chunk.choices[0].delta.content is not None:
-                                full_response += chunk.choices[0].delta.content
-                                message_placeholder.markdown(full_response + "▌")
-                        message_placeholder.markdown(full_response)
+                    messages = st.session_state.messages
+                    history_start = st.session_state.history_start
+                    context = retrieval_context(prompt)
+                    reserved = chat_history.estimate_tokens(messages[0]["content"]) + chat_history.SUMMARY_MAX_TOKENS
+                    if context:
+                        reserved += chat_history.estimate_tokens(context["content"])
+                    keep_from = chat_history.compaction_point(messages, history_start, HISTORY_TOKEN_BUDGET, reserved)
+                    if keep_from > history_start:
+                        try:
+                            with st.spinner("正在压缩较早的对话..."):
+                                st.session_state.history_summary = chat_history.summarize_turns(
+                                    client, DEEPSEEK_MODEL, st.session_state.history_summary,
+                                    messages[history_start:keep_from])
+                        except Exception as e:
+                            st.warning(f"压缩较早的对话失败，这部分对话将不再发送: {e}")
+                        st.session_state.history_start = keep_from
+
+                    request = chat_history.request_messages(messages, st.session_state.history_summary,
+                                                            st.session_state.history_start, context)
+                    key_cached = response_cache.cache_key(DEEPSEEK_MODEL, request)
+                    cached_response = response_cache.lookup(key_cached, CHAT_CACHE_PATH, CHAT_CACHE_TTL)
+                    if cached_response is not None:
+                        full_response = render_stream(replay_deltas(cached_response), st.empty())
                         st.session_state.messages.append({"role": "assistant", "content": full_response})
-                    except Exception as e:
-                        st.error(f"调用 DeepSeek API 时出错: {e}")
-                        if st.session_state.messages[-1]["role"] == "user":
+                    else:
+                        generation = chat_worker.start(
+                            client, DEEPSEEK_MODEL, request, generation_slots(),
+                            on_complete=functools.partial(response_cache.store, key_cached, path=CHAT_CACHE_PATH,
+                                                          ttl=CHAT_CACHE_TTL, max_entries=CHAT_CACHE_MAX_ENTRIES))
+                        if generation is None:
+                            st.session_state.chat_notice = "当前正在生成的回答过多，请稍后再试。"
                             st.session_state.messages.pop()
+                        else:
+                            st.session_state.chat_generation = generation
+                        st.rerun()  # Redraw with the input disabled and the answer streaming in show_generation()
+            if "chat_generation" in st.session_state:
+                show_generation()  # Only rendered while generating, so an idle chat tab does not poll
+            cache_stats = response_cache.stats(CHAT_CACHE_PATH)
+            cache_caption.caption(f"回答缓存：命中 {cache_stats['hits']} 次，未命中 {cache_stats['misses']} 次，"
+                                  f"已缓存 {cache_stats['entries']} 条回答")
         except Exception as e:
-            st.error(f"初始化 OpenAI 客户端时出错: {e}. 请检查您的 API 密钥和网络连接。")
-            st.session_state.api_key = None
-            st.rerun()  # Changed from st.experimental_rerun()
+            st.error(f"对话出错: {e}")
 
-with tabs[4]:
+if active_tab == TAB_NAMES[5]:
     st.markdown("### 操作示例说明")
-    op_example_image_folder = "pic"
-    op_example_image_files = [f"{i}.png" for i in range(30, 34)]
-    for img_file in op_example_image_files:
-        try:
-            full_path = os.path.join(op_example_image_folder, img_file)
-            if os.path.exists(full_path):
-                image = Image.open(full_path)
-                st.image(image, width=1200, caption=f"操作示例: {img_file}")
-            else:
-                st.warning(f"图片文件 {full_path} 未找到。")
-        except Exception as e:
-            st.error(f"加载图片 {img_file} 时出错: {e}")
+    op_example_sources = []
+    for img_file in OPERATION_EXAMPLE_IMAGES:
+        full_path = os.path.join(image_cache.SOURCE_DIR, img_file)
+        if os.path.exists(full_path):
+            op_example_sources.append(full_path)
+        else:
+            st.warning(f"图片文件 {full_path} 未找到。")
+    show_gallery(op_example_sources, "操作示例", key="example_gallery")
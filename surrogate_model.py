@@ -0,0 +1,123 @@
+"""Surrogate model of isentropic efficiency over compressor speed and mass flow.
+
+A Gaussian-process regressor (smooth, so its predictions draw as a
+continuous performance map) is fitted to the workbook's operating points.
+The fitted model is pickled next to the workbook under the workbook's
+SHA-256 (``data1/data1.surrogate-<hash>.pkl``), so each version of the data
+is trained once, ever. Fitting takes seconds, so the app runs train() in a
+separate process; it lives in this module so that process can import it.
+
+Train ahead of time with::
+
+    python surrogate_model.py [workbook.xlsx ...]
+"""
+import glob
+import os
+import pickle
+import sys
+
+import numpy as np
+import pandas as pd
+
+import data_store
+
+FEATURES = ('compressor speed', 'Air Mass Flow Rate')
+TARGET = 'Isentropic efficiency'
+MAX_TRAINING_POINTS = 2000  # Gaussian-process fitting is cubic in the number of points
+CV_FOLDS = 5
+RANDOM_STATE = 0
+
+
+def model_path(xlsx_path, source_hash):
+    return f"{os.path.splitext(xlsx_path)[0]}.surrogate-{source_hash[:16]}.pkl"
+
+
+def training_data(frame):
+    # (X, y) from the rows that have speed, flow and efficiency, subsampled to MAX_TRAINING_POINTS.
+    data = frame[list(FEATURES) + [TARGET]].apply(pd.to_numeric, errors='coerce').dropna()
+    if len(data) > MAX_TRAINING_POINTS:
+        data = data.sample(MAX_TRAINING_POINTS, random_state=RANDOM_STATE)
+    return data[list(FEATURES)].to_numpy(np.float64), data[TARGET].to_numpy(np.float64)
+
+
+class Surrogate:
+    def __init__(self, model, X, cv_r2):
+        self.model = model
+        self.cv_r2 = cv_r2  # Mean cross-validated R², None when there were too few points
+        self.n_samples = len(X)
+        self.bounds = (X.min(axis=0), X.max(axis=0))
+        self._hull_points = X
+
+    def predict_grid(self, grid_points=80):
+        # (speed axis, flow axis, efficiency grid of shape (flow, speed)) from one batched predict() call.
+        # Cells outside the convex hull of the training points are NaN rather than extrapolated.
+        from scipy.spatial import Delaunay, QhullError
+
+        lo, hi = self.bounds
+        xi, yi = np.linspace(lo[0], hi[0], grid_points), np.linspace(lo[1], hi[1], grid_points)
+        Xi, Yi = np.meshgrid(xi, yi)
+        grid = np.column_stack([Xi.ravel(), Yi.ravel()])
+        zi = self.model.predict(grid)
+        try:
+            scale = np.where(hi > lo, hi - lo, 1.0)
+            outside = Delaunay((self._hull_points - lo) / scale).find_simplex((grid - lo) / scale) < 0
+            zi[outside] = np.nan
+        except QhullError:
+            pass  # Collinear or too few points: no hull to clip to
+        return xi, yi, zi.reshape(Xi.shape)
+
+
+def _regressor():
+    from sklearn.gaussian_process import GaussianProcessRegressor
+    from sklearn.gaussian_process.kernels import RBF, ConstantKernel, WhiteKernel
+    from sklearn.pipeline import make_pipeline
+    from sklearn.preprocessing import StandardScaler
+
+    kernel = ConstantKernel() * RBF(length_scale=[1.0, 1.0]) + WhiteKernel()
+    return make_pipeline(StandardScaler(), GaussianProcessRegressor(kernel, normalize_y=True, random_state=RANDOM_STATE))
+
+
+def fit(frame):
+    from sklearn.model_selection import KFold, cross_val_score
+
+    X, y = training_data(frame)
+    if len(X) < 3:
+        raise ValueError(f"Only {len(X)} rows have {', '.join(FEATURES)} and {TARGET}; at least 3 are needed.")
+    cv_r2 = None
+    if len(X) >= 2 * CV_FOLDS:
+        cv = KFold(CV_FOLDS, shuffle=True, random_state=RANDOM_STATE)
+        cv_r2 = float(cross_val_score(_regressor(), X, y, cv=cv, scoring='r2').mean())
+    return Surrogate(_regressor().fit(X, y), X, cv_r2)
+
+
+def train(xlsx_path, source_hash=None):
+    # Fits and saves the model for this version of the workbook (unless it already exists) and removes
+    # models of older versions. Returns the model path. Runs in a worker process, so it reads the workbook
+    # itself instead of receiving the frame.
+    source_hash = source_hash or data_store.file_sha256(xlsx_path)
+    target = model_path(xlsx_path, source_hash)
+    if os.path.exists(target):
+        return target
+    surrogate = fit(data_store.load_workbook(xlsx_path))
+    with data_store.atomic_output(target) as tmp, open(tmp, 'wb') as f:
+        pickle.dump(surrogate, f, protocol=pickle.HIGHEST_PROTOCOL)
+    for stale in glob.glob(model_path(xlsx_path, '*')):
+        if stale != target:
+            os.remove(stale)
+    return target
+
+
+def load(xlsx_path, source_hash):
+    # The saved model for this workbook version, or None if it has not been trained yet.
+    try:
+        with open(model_path(xlsx_path, source_hash), 'rb') as f:
+            return pickle.load(f)
+    except FileNotFoundError:
+        return None
+
+
+if __name__ == '__main__':
+    import surrogate_model  # Pickle Surrogate under its importable name, not __main__
+
+    for xlsx in sys.argv[1:] or data_store.DEFAULT_WORKBOOKS[:1]:
+        print(f"{xlsx} -> {surrogate_model.train(xlsx)}")
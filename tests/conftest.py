@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The app's modules live in the repository root, next to streamlit_app4.py.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,120 @@
+import numpy as np
+import pandas as pd
+import pytest
+from scipy.stats import gaussian_kde
+
+import chart_kernels
+
+
+@pytest.fixture
+def frame():
+    # Correlated columns with different missing rows, so pairwise-complete counts differ per pair.
+    rng = np.random.default_rng(0)
+    base = rng.normal(size=3000)
+    data = pd.DataFrame({
+        'a': base,
+        'b': 2 * base + rng.normal(size=3000),
+        'c': np.exp(base) + rng.normal(scale=0.5, size=3000),
+        'd': rng.normal(size=3000),
+    })
+    for col, fraction in (('b', 0.1), ('c', 0.3), ('d', 0.05)):
+        data.loc[rng.random(3000) < fraction, col] = np.nan
+    return data
+
+
+def _inputs(frame):
+    return frame.to_numpy(np.float64), frame.notna().to_numpy()
+
+
+def test_pairwise_pearson_matches_pandas(frame):
+    values, mask = _inputs(frame)
+    r, counts = chart_kernels.pairwise_pearson(values, mask)
+    np.testing.assert_allclose(r, frame.corr(method='pearson').to_numpy(), atol=1e-10)
+    np.testing.assert_array_equal(counts, mask.T.astype(int) @ mask.astype(int))
+
+
+def test_pairwise_pearson_accumulates_across_chunks(frame, monkeypatch):
+    monkeypatch.setattr(chart_kernels, 'CORRELATION_CHUNK_ROWS', 7)
+    values, mask = _inputs(frame)
+    r, _ = chart_kernels.pairwise_pearson(values, mask)
+    np.testing.assert_allclose(r, frame.corr(method='pearson').to_numpy(), atol=1e-10)
+
+
+def test_pairwise_pearson_constant_column_is_nan():
+    values = np.column_stack([np.arange(10.0), np.full(10, 3.0)])
+    r, _ = chart_kernels.pairwise_pearson(values, np.ones_like(values, dtype=bool))
+    assert np.isnan(r[0, 1]) and np.isnan(r[1, 1])
+
+
+def test_spearman_matrix_matches_pandas(frame):
+    values, mask = _inputs(frame)
+    _, counts = chart_kernels.pairwise_pearson(values, mask)
+    r, exact = chart_kernels.spearman_matrix(values, mask, counts)
+    assert exact
+    np.testing.assert_allclose(r, frame.corr(method='spearman').to_numpy(), atol=1e-10)
+
+
+def test_spearman_matrix_over_budget_is_flagged_inexact(frame, monkeypatch):
+    monkeypatch.setattr(chart_kernels, 'SPEARMAN_EXACT_MAX_CELLS', 0)
+    values, mask = _inputs(frame)
+    _, counts = chart_kernels.pairwise_pearson(values, mask)
+    r, exact = chart_kernels.spearman_matrix(values, mask, counts)
+    assert not exact
+    np.testing.assert_allclose(r, frame.corr(method='spearman').to_numpy(), atol=0.05)
+
+
+def test_float32_values_match_float64(frame):
+    # The app passes float32 columns (UploadedDataset.numeric_array); accuracy is that of the inputs.
+    values, mask = _inputs(frame)
+    pearson, counts = chart_kernels.pairwise_pearson(values.astype(np.float32), mask)
+    spearman, exact = chart_kernels.spearman_matrix(np.asfortranarray(values, np.float32), mask, counts)
+    assert exact
+    np.testing.assert_allclose(pearson, frame.corr(method='pearson').to_numpy(), atol=1e-6)
+    np.testing.assert_allclose(spearman, frame.corr(method='spearman').to_numpy(), atol=1e-6)
+
+
+@pytest.mark.parametrize('sample', ['normal', 'bimodal'])
+def test_binned_kde_matches_gaussian_kde(sample):
+    rng = np.random.default_rng(1)
+    values = rng.normal(size=5000)
+    if sample == 'bimodal':
+        values = np.concatenate([values, rng.normal(loc=6, scale=0.5, size=2000)])
+    grid, density = chart_kernels.binned_kde(values, values.min(), values.max())
+    expected = gaussian_kde(values)(grid)
+    assert np.abs(density - expected).max() <= 1e-4 * expected.max()
+
+
+def test_binned_kde_without_spread_is_none():
+    assert chart_kernels.binned_kde(np.full(5, 2.0), 2.0, 2.0) is None
+
+
+def test_density_summary():
+    values = np.append(np.random.default_rng(2).normal(size=10_000), [np.nan, np.inf])
+    summary = chart_kernels.density_summary(values, bin_size=0.2, rug_points=100)
+    widths = np.diff(summary['edges'])
+    assert (summary['density'] * widths).sum() == pytest.approx(1)
+    assert len(summary['rug']) == 100 and np.all(np.diff(summary['rug']) >= 0)
+    assert summary['rug'][0] == np.nanmin(values[np.isfinite(values)])
+
+
+def test_decimate_indices_keeps_budget_and_extremes():
+    rng = np.random.default_rng(3)
+    columns = [rng.normal(size=50_000), rng.uniform(size=50_000), rng.exponential(size=50_000)]
+    columns[0][10] = np.nan
+    keep = chart_kernels.decimate_indices(columns, 2000)
+    assert len(keep) <= 2000 and 10 not in keep
+    for values in columns:
+        assert np.nanargmax(values) in keep and np.nanargmin(values) in keep
+
+
+def test_decimate_indices_under_budget_keeps_everything():
+    np.testing.assert_array_equal(chart_kernels.decimate_indices([np.arange(5.0)], 10), np.arange(5))
+
+
+def test_stack_row_ranges_matches_concat():
+    frame = pd.DataFrame({'x': np.arange(20.0), 'y': np.arange(20.0) ** 2, 'z': 0})
+    ranges, labels = [(2, 5), (4, 8), (9, 3), (15, 25), (19, 19)], ['a', 'b', 'c', 'd', 'e']
+    expected = pd.concat([frame.iloc[start:end + 1][['x', 'y']].assign(group=label)
+                          for (start, end), label in zip(ranges, labels) if start <= end < len(frame)],
+                         ignore_index=True)
+    pd.testing.assert_frame_equal(chart_kernels.stack_row_ranges(frame, ['x', 'y'], ranges, labels), expected)
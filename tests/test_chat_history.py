@@ -0,0 +1,45 @@
+import pytest
+
+import chat_history
+from chat_history import MESSAGE_OVERHEAD_TOKENS as OVERHEAD
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('', OVERHEAD),
+    ('a' * 10, 3 + OVERHEAD),
+    ('叶' * 10, 6 + OVERHEAD),
+    ('叶顶间隙 tip', int(0.6 * 4 + 0.3 * 4) + OVERHEAD),
+    ('，。？', int(0.6 * 3) + OVERHEAD),  # Full-width punctuation counts as CJK
+    ('ｔｉｐ', int(0.6 * 3) + OVERHEAD),  # Full-width letters as well
+])
+def test_estimate_tokens(text, expected):
+    assert chat_history.estimate_tokens(text) == expected
+
+
+def _turns(*sizes):
+    # Alternating user/assistant messages whose estimate_tokens() is exactly each size (>= OVERHEAD).
+    roles = ('user', 'assistant')
+    return [{'role': roles[i % 2], 'content': 'a' * int((size - OVERHEAD) / 0.3 + 0.5)} for i, size in enumerate(sizes)]
+
+
+@pytest.mark.parametrize('sizes, start, budget, reserved, expected', [
+    ((10, 10, 10, 10, 10), 0, 50, 0, 0),   # Fits exactly: nothing to compact
+    ((40, 10, 10, 10, 10), 0, 79, 0, 2),   # Over budget: drop turns until within half of it
+    ((40, 10, 10, 10, 10), 0, 90, 11, 2),  # reserved (system prompt, summary) counts against the budget
+    ((10, 10, 10, 10, 10), 0, 49, 0, 4),   # Half the budget is reached at an assistant turn: move on to a user turn
+    ((10, 10, 10, 10, 10), 2, 30, 0, 2),   # Only messages from `start` on are counted
+    ((100,), 0, 20, 0, 0),                 # The newest message is always kept
+    ((10, 10, 100), 0, 20, 0, 2),
+])
+def test_compaction_point(sizes, start, budget, reserved, expected):
+    messages = _turns(*sizes)
+    assert [chat_history.estimate_tokens(m['content']) for m in messages] == list(sizes)
+    assert chat_history.compaction_point(messages, start, budget, reserved) == expected
+
+
+def test_request_messages_places_summary_and_context():
+    messages = [{'role': 'system', 'content': 'sys'}] + _turns(10, 10, 10)
+    context = {'role': 'system', 'content': 'records'}
+    request = chat_history.request_messages(messages, 'summary', 2, context)
+    assert [m['content'] for m in request] == ['sys', '此前对话的摘要：\nsummary', messages[2]['content'], 'records',
+                                               messages[3]['content']]
@@ -0,0 +1,65 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import chat_worker
+
+
+class StalledStream:
+    # Yields the given deltas, then blocks like a server that stopped sending until close() is called.
+    def __init__(self, deltas):
+        self._deltas = deltas
+        self._closed = threading.Event()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __iter__(self):
+        for delta in self._deltas:
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=delta))])
+        self._closed.wait(30)
+        raise ConnectionError('response closed')
+
+    def close(self):
+        self._closed.set()
+
+
+def _client(stream):
+    return SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=lambda **kwargs: stream)))
+
+
+def _wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_cancel_frees_a_stalled_generation():
+    slots = threading.BoundedSemaphore(1)
+    completed = []
+    generation = chat_worker.start(_client(StalledStream(['a', 'b'])), 'model', [], slots, completed.append)
+    assert _wait_for(lambda: generation.text() == 'ab')
+    assert chat_worker.start(_client(StalledStream([])), 'model', [], slots) is None
+    generation.cancel()
+    assert _wait_for(lambda: generation.done, timeout=2)
+    assert generation.cancelled and generation.error is None and completed == []
+    assert slots.acquire(blocking=False)
+
+
+def test_complete_answer_calls_on_complete():
+    class FiniteStream(StalledStream):
+        def __iter__(self):
+            for delta in self._deltas:
+                yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=delta))])
+
+    slots = threading.BoundedSemaphore(1)
+    completed = []
+    generation = chat_worker.start(_client(FiniteStream(['a', None, 'b'])), 'model', [], slots, completed.append)
+    assert _wait_for(lambda: generation.done)
+    assert completed == ['ab'] and generation.error is None
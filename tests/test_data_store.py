@@ -0,0 +1,52 @@
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+import data_store
+
+
+@pytest.fixture
+def workbook(tmp_path):
+    path = str(tmp_path / 'book.xlsx')
+    rows = [['参数大类', None], ['参数分组', None], ['Tip clearance', '材料'], [0.5, 'steel'], [0.7, 12]]
+    pd.DataFrame(rows).to_excel(path, header=False, index=False)
+    return path
+
+
+def _metadata(path):
+    with pa.memory_map(path, 'r') as source:
+        return pa.ipc.open_file(source).schema.metadata
+
+
+def test_sidecar_is_built_once_and_reused(workbook, monkeypatch):
+    frame = data_store.load_workbook(workbook)
+    assert list(frame.columns) == ['Tip clearance', '材料']
+    metadata = _metadata(data_store.sidecar_path(workbook))
+    assert metadata[b'source_sha256'] == data_store.file_sha256(workbook).encode()
+    assert metadata[b'sidecar_format'] == str(data_store.SIDECAR_FORMAT_VERSION).encode()
+
+    monkeypatch.setattr(data_store, 'build_sidecar', lambda *args: pytest.fail('sidecar rebuilt'))
+    pd.testing.assert_frame_equal(data_store.load_workbook(workbook), frame)
+
+
+def test_sidecar_of_another_format_version_is_rebuilt(workbook, monkeypatch):
+    data_store.load_workbook(workbook)
+    sidecar = data_store.sidecar_path(workbook)
+    monkeypatch.setattr(data_store, 'SIDECAR_FORMAT_VERSION', data_store.SIDECAR_FORMAT_VERSION + 1)
+    built = []
+    build_sidecar = data_store.build_sidecar
+    monkeypatch.setattr(data_store, 'build_sidecar', lambda *args: built.append(args) or build_sidecar(*args))
+    data_store.load_workbook(workbook)
+    assert len(built) == 1
+    assert _metadata(sidecar)[b'sidecar_format'] == str(data_store.SIDECAR_FORMAT_VERSION).encode()
+
+
+def test_sidecar_without_format_version_is_rebuilt(workbook):
+    # Sidecars written before the format key existed only carry the source hash.
+    source_hash = data_store.file_sha256(workbook)
+    table = pa.Table.from_pandas(pd.DataFrame({'old': [1]}))
+    table = table.replace_schema_metadata({b'source_sha256': source_hash.encode()})
+    with pa.OSFile(data_store.sidecar_path(workbook), 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    assert list(data_store.load_workbook(workbook).columns) == ['Tip clearance', '材料']
+    assert b'sidecar_format' in _metadata(data_store.sidecar_path(workbook))
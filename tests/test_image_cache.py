@@ -0,0 +1,38 @@
+import os
+
+import pytest
+
+import image_cache
+
+
+@pytest.fixture
+def derived_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(image_cache, 'DERIVED_DIR', str(tmp_path))
+    return tmp_path
+
+
+def _touch(directory, *names):
+    for name in names:
+        (directory / name).write_bytes(b'')
+
+
+def test_prune_stale_removes_only_older_derivatives_of_the_same_source(derived_dir):
+    current = 'blade-' + 'a' * 16 + '-w1200.webp'
+    older = 'blade-' + 'b' * 16 + '-w1200.webp'
+    kept = [
+        current,
+        'blade-' + 'b' * 16 + '-w320.webp',    # Other width
+        'blade-2-' + 'c' * 16 + '-w1200.webp',  # Other image whose name starts with the stem
+        'blade-x-w1200.webp',
+        'blade[1]-' + 'd' * 16 + '-w1200.webp',
+    ]
+    _touch(derived_dir, older, *kept)
+    image_cache._prune_stale(os.path.join(str(derived_dir), current), 1200)
+    assert sorted(os.listdir(derived_dir)) == sorted(kept)
+
+
+def test_prune_stale_handles_glob_characters_in_the_stem(derived_dir):
+    current = 'blade[1]-' + 'a' * 16 + '-w320.webp'
+    _touch(derived_dir, current, 'blade[1]-' + 'b' * 16 + '-w320.webp', 'blade1-' + 'c' * 16 + '-w320.webp')
+    image_cache._prune_stale(os.path.join(str(derived_dir), current), 320)
+    assert sorted(os.listdir(derived_dir)) == sorted([current, 'blade1-' + 'c' * 16 + '-w320.webp'])
@@ -0,0 +1,82 @@
+import os
+import stat
+
+import pytest
+
+import response_cache
+
+
+class Clock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(response_cache.time, 'time', clock)
+    return clock
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'cache' / 'responses.sqlite3')
+
+
+def test_store_then_lookup_is_a_hit(path, clock):
+    key = response_cache.cache_key('model', [{'role': 'user', 'content': '叶顶间隙？'}])
+    assert response_cache.lookup(key, path) is None
+    response_cache.store(key, 'answer', path)
+    assert response_cache.lookup(key, path) == 'answer'
+    assert response_cache.stats(path) == {'hits': 1, 'misses': 1, 'entries': 1}
+
+
+def test_normalized_prompts_share_a_key():
+    key = response_cache.cache_key('model', [{'role': 'user', 'content': 'Tip  Clearance？'}])
+    assert key == response_cache.cache_key('model', [{'role': 'user', 'content': 'tip clearance?'}])
+    assert key != response_cache.cache_key('other', [{'role': 'user', 'content': 'tip clearance?'}])
+
+
+def test_expired_entry_is_a_miss_and_deleted(path, clock):
+    response_cache.store('key', 'answer', path, ttl=60)
+    clock.now += 61
+    assert response_cache.lookup('key', path, ttl=60) is None
+    assert response_cache.stats(path) == {'hits': 0, 'misses': 1, 'entries': 0}
+
+
+def test_max_entries_evicts_the_least_recently_used(path, clock):
+    for key in ('a', 'b', 'c'):
+        clock.now += 1
+        response_cache.store(key, key.upper(), path, max_entries=3)
+    clock.now += 1
+    assert response_cache.lookup('a', path) == 'A'  # 'b' is now the least recently used
+    clock.now += 1
+    response_cache.store('d', 'D', path, max_entries=3)
+    assert response_cache.lookup('b', path) is None
+    assert [response_cache.lookup(key, path) for key in ('a', 'c', 'd')] == ['A', 'C', 'D']
+    assert response_cache.stats(path)['entries'] == 3
+
+
+def test_uncreatable_directory_is_a_miss(tmp_path, clock):
+    blocker = tmp_path / 'cache'
+    blocker.write_text('not a directory')
+    path = str(blocker / 'responses.sqlite3')
+    response_cache.store('key', 'answer', path)
+    assert response_cache.lookup('key', path) is None
+    assert response_cache.stats(path) == {'hits': 0, 'misses': 0, 'entries': 0}
+
+
+@pytest.mark.skipif(hasattr(os, 'geteuid') and os.geteuid() == 0, reason='root can write read-only directories')
+def test_read_only_directory_is_a_miss(tmp_path, clock):
+    directory = tmp_path / 'cache'
+    directory.mkdir()
+    directory.chmod(stat.S_IRUSR | stat.S_IXUSR)
+    try:
+        path = str(directory / 'responses.sqlite3')
+        response_cache.store('key', 'answer', path)
+        assert response_cache.lookup('key', path) is None
+    finally:
+        directory.chmod(stat.S_IRWXU)
@@ -0,0 +1,58 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+import upload_data
+
+WORKBOOK = os.path.join(os.path.dirname(__file__), '..', 'data1', 'data1.xlsx')
+UPLOAD_HEADER_ROW = 2  # streamlit_app4.UPLOAD_HEADER_ROW
+
+
+@pytest.fixture(scope='module')
+def workbook_dataset():
+    with open(WORKBOOK, 'rb') as f:
+        raw = upload_data.read_upload('data1.xlsx', UPLOAD_HEADER_ROW, f.read())
+    return upload_data.ingest('data1', raw)
+
+
+def test_workbook_frame_converts_to_arrow(workbook_dataset):
+    # st.dataframe serialises through Arrow; mixed str/number cells used to make mixed-type categories.
+    table = pa.Table.from_pandas(workbook_dataset.frame)
+    assert table.num_rows == len(workbook_dataset.frame)
+
+
+def test_workbook_mixed_columns_keep_their_numbers(workbook_dataset):
+    for col in ('第二级进口轮罩直径/mm', '轮毂直径 '):
+        assert isinstance(workbook_dataset.frame[col].dtype, pd.CategoricalDtype)
+        assert col in workbook_dataset.coerced
+        assert workbook_dataset.valid[col].any()
+
+
+def test_mixed_text_column_becomes_string_categories():
+    raw = pd.DataFrame({'mixed': ['a', 2, 3.5, np.nan], 'text': ['x', 'y', None, 'x']}, dtype=object)
+    dataset = upload_data.ingest('mixed', raw)
+    categories = dataset.frame['mixed'].cat.categories
+    assert list(categories) == sorted(['a', '2', '3.5'])
+    assert dataset.frame['mixed'].isna().tolist() == [False, False, False, True]
+    np.testing.assert_array_equal(dataset.numeric(['mixed'])['mixed'], [np.nan, 2, 3.5, np.nan])
+    assert dataset.valid['text'].tolist() == [False] * 4
+    pa.Table.from_pandas(dataset.frame)
+
+
+def test_numeric_columns_stay_exact():
+    raw = pd.DataFrame({'id': [1, 2, 3], 'big': [2.0 ** 30, 1.0, np.nan], 'x': [0.5, 1.25, 2.0]})
+    dataset = upload_data.ingest('numbers', raw)
+    assert dataset.frame['id'].dtype == np.int8
+    assert dataset.frame['big'].dtype == np.float64
+    assert dataset.frame['x'].dtype == np.float32
+    assert dataset.valid_rows(['id', 'big']).tolist() == [True, True, False]
+
+
+def test_numeric_array_matches_numeric(workbook_dataset):
+    cols = [c for c in workbook_dataset.frame.columns if workbook_dataset.valid[c].any()]
+    values = workbook_dataset.numeric_array(cols)
+    assert values.dtype == np.float32 and values.flags.f_contiguous
+    np.testing.assert_array_equal(values, workbook_dataset.numeric(cols).to_numpy(np.float32))
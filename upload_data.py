@@ -0,0 +1,93 @@
+"""Typing of uploaded CSV/Excel tables for the analysis charts.
+
+An upload is parsed once into an ``UploadedDataset``: fully numeric columns
+get the smallest dtype that keeps their values, text columns become string
+categoricals, and the numbers found in partly numeric text columns are kept
+aside so every chart reads the same coerced values.
+"""
+import io
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+FLOAT32_EXACT_INTEGERS = 2 ** 24  # Whole numbers up to this size survive a float32 round trip
+
+
+@dataclass(frozen=True)
+class UploadedDataset:
+    # Typed once per upload and shared read-only by every chart; never assign into these frames.
+    content_hash: str
+    frame: pd.DataFrame  # Compact numbers (see _compact_numbers) for fully numeric columns, categorical for text columns
+    coerced: dict        # column -> float32 numbers found in a partly numeric text column
+    valid: pd.DataFrame  # True where numeric() returns a number
+
+    def numeric(self, columns):
+        # Float values of `columns`, NaN where a cell is not a number (the old pd.to_numeric(errors='coerce')).
+        data = {}
+        for col in dict.fromkeys(columns):
+            data[col] = _numbers_of(self.frame[col], self.coerced.get(col))
+        return pd.DataFrame(data, index=self.frame.index)
+
+    def numeric_array(self, columns, dtype=np.float32):
+        # numeric() as one column-major array, filled a column at a time instead of via a frame of float64s.
+        values = np.empty((len(self.frame), len(columns)), dtype, order='F')
+        for k, col in enumerate(columns):
+            values[:, k] = _numbers_of(self.frame[col], self.coerced.get(col)).to_numpy()
+        return values
+
+    def valid_rows(self, columns):
+        return self.valid[list(dict.fromkeys(columns))].all(axis=1).to_numpy()
+
+
+def _numbers_of(column, coerced=None):
+    if coerced is not None:
+        return coerced
+    if pd.api.types.is_float_dtype(column):
+        return column
+    if pd.api.types.is_integer_dtype(column):
+        return column.astype('float64')  # Exact for the integers an upload holds
+    return pd.Series(np.nan, index=column.index, dtype='float32')
+
+
+def _compact_numbers(values):
+    # The smallest dtype that does not change whole numbers: IDs and counts stay exact, and only fractional
+    # measurements are rounded to float32 (about 7 significant digits).
+    if values.dtype.kind == 'b':
+        return values.astype('float32')
+    if values.dtype.kind in 'iu':
+        return pd.to_numeric(values, downcast='integer')
+    finite = values[np.isfinite(values)]
+    if (finite == np.round(finite)).all() and (np.abs(finite) > FLOAT32_EXACT_INTEGERS).any():
+        return values.astype('float64')
+    return values.astype('float32')
+
+
+def _text_categories(column):
+    # Cells of a text column can mix str with the int/float Excel stored for some rows; one category
+    # type is required for Arrow (st.dataframe), so everything but the missing cells is shown as text.
+    return column.where(column.isna(), column.astype(str)).astype('category')
+
+
+def read_upload(file_name, header, data):
+    if file_name.endswith('.csv'):
+        return pd.read_csv(io.BytesIO(data), header=header)
+    if file_name.endswith('.xlsx'):
+        return pd.read_excel(io.BytesIO(data), header=header, engine='openpyxl')
+    return None
+
+
+def ingest(content_hash, raw):
+    frame, coerced, valid = {}, {}, {}
+    for col in raw.columns:
+        values = pd.to_numeric(raw[col], errors='coerce') if raw[col].dtype.kind in 'iufbO' else None
+        if values is not None and values.notna().sum() == raw[col].notna().sum():
+            frame[col] = _compact_numbers(values)
+        elif raw[col].dtype == object:
+            frame[col] = _text_categories(raw[col])
+            if values.notna().any():
+                coerced[col] = values.astype('float32')
+        else:
+            frame[col] = raw[col]  # Dates and the like: shown as they are, never a number
+        valid[col] = _numbers_of(frame[col], coerced.get(col)).notna().to_numpy()
+    return UploadedDataset(content_hash, pd.DataFrame(frame), coerced, pd.DataFrame(valid, index=raw.index))